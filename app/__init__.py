@@ -1,11 +1,36 @@
 # /app/__init__.py
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
 from config import Config,instance_path
 
 # 1. 初始化 SQLAlchemy 实例 (但不绑定 app)
 db = SQLAlchemy()
 
+def _set_sqlite_pragma(dbapi_connection, connection_record):
+    """
+    每个新的 SQLite 连接都打开 WAL 模式:
+    多个 worker 进程可以一边读一边写, 读请求不会被写事务阻塞
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.close()
+
+# 已经被替换掉的索引 (旧数据库中删除)
+_OBSOLETE_INDEXES = ('ix_order_user_time',)
+
+def _create_missing_indexes():
+    """
+    create_all 只在建表时创建索引; 已经存在的表 (旧数据库) 上新增的索引在这里补上
+    """
+    with db.engine.begin() as conn:
+        for name in _OBSOLETE_INDEXES:
+            conn.exec_driver_sql(f'DROP INDEX IF EXISTS "{name}"')
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
 def create_app(config_class=Config):
     """
     应用工厂函数
@@ -14,6 +39,22 @@ def create_app(config_class=Config):
     
     # 2. 从 config.py 加载配置
     app.config.from_object(config_class)
+
+    # 使用 orjson 加速 jsonify (见 app/json_provider.py)
+    from .json_provider import init_json
+    init_json(app)
+
+    # 日志走后台线程 (见 app/logging_setup.py), 要在其他模块打日志之前初始化
+    from .logging_setup import init_logging
+    init_logging(app)
+
+    # 密码哈希线程池过载时返回 503 (见 app/auth.py)
+    from .auth import init_auth
+    init_auth(app)
+
+    # 订单组提交的后台线程按 worker 进程创建 (见 app/order_intake.py)
+    from .order_intake import init_order_intake
+    init_order_intake(app)
     
     # 3. 将 db 实例与 app 绑定
     db.init_app(app)
@@ -22,9 +63,26 @@ def create_app(config_class=Config):
     #    我们在这里导入，以防止循环导入
     with app.app_context():
         from . import models
+        if db.engine.dialect.name == 'sqlite':
+            event.listen(db.engine, 'connect', _set_sqlite_pragma)
         db.create_all() # 自动创建所有不存在的表
+        _create_missing_indexes()
+
+        # 启动时 (serve.py 中是 fork 之前) 发布一次共享价格表和餐厅目录
+        from .pricing import publish_price_table
+        publish_price_table()
+        from .catalog import publish_catalog
+        publish_catalog()
+
+        # 菜品 / 餐厅全文搜索索引 (见 app/search.py)
+        from .search import init_search
+        init_search(app)
     
-    # 5. (稍后) 在这里注册我们的 API 蓝图
+    # 5. 请求统计 (延迟 / SQL 条数 / 数据库耗时), 见 /api/admin/metrics
+    from .metrics import init_metrics
+    init_metrics(app)
+
+    # 6. (稍后) 在这里注册我们的 API 蓝图
     from .api import bp as api_bp
     app.register_blueprint(api_bp, url_prefix='/api')
     
@@ -32,4 +90,17 @@ def create_app(config_class=Config):
     def hello():
         return "Hello, Canteen App is running!"
 
-    return app
\ No newline at end of file
+    return app
+
+def dispose_engines_after_fork(app):
+    """
+    (多进程部署) 在 worker 进程 fork 之后调用
+
+    master 进程在 preload 时已经打开过数据库连接 (create_all),
+    这些连接会被 fork 复制到每个 worker 中。两个进程共用同一个 SQLite 文件句柄
+    是不安全的, 所以这里丢弃继承来的连接池 (close=False: 不去关闭父进程的连接),
+    worker 第一次查询时会重新建立自己的连接。
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
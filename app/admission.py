@@ -0,0 +1,240 @@
+# /app/admission.py
+"""
+午高峰 "准入控制" (Admission Control)
+
+中午开饭时 /api/order/create 和菜单请求会在同一时刻涌入, 超过数据库能承受的量,
+结果是所有请求一起变慢、一起超时。这里在每个 worker 进程内为热点接口加上:
+    - 并发上限: 同时最多处理 max_concurrent 个请求
+    - 有界等待队列: 最多 max_queue 个请求排队 (先进先出), 再多直接拒绝
+    - 按截止时间丢弃: 根据平均处理时间估算排队时间, 肯定等不到的请求立即拒绝,
+      而不是排到最后再超时 (客户端可以用 X-Request-Timeout 头告诉我们它最多等几秒)
+    - 按餐厅公平: 有其他餐厅的请求在排队时, 单个餐厅占用的 (处理中 + 排队) 名额不能超过上限,
+      热门餐厅不会把其他餐厅饿死; 没有别的餐厅在等时不限制 (这不是配额)
+被拒绝的请求快速返回 429 (单个餐厅超限) 或 503 (整体过载), 并带 Retry-After 头。
+"""
+import math
+import threading
+import time
+from collections import deque
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status, reason, retry_after):
+        super().__init__(reason)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    一个接口 (或一组接口) 的并发闸门
+    """
+
+    def __init__(self, name, max_concurrent, max_queue, max_wait, per_key_limit=None):
+        self.name = name
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.per_key_limit = per_key_limit
+
+        self._cond = threading.Condition()
+        self._active = 0
+        self._waiters = deque()  # 排队中的请求 (先进先出), 每项是 (标记, key)
+        self._per_key = {}       # key -> 处理中 + 排队中的数量
+        self._avg_service = 0.05 # 平均处理时间 (秒), 指数滑动平均
+
+        # 统计
+        self.admitted_total = 0
+        self.rejected_total = {}  # reason -> count
+        self.peak_queue = 0
+
+    def _reject(self, status, reason, retry_after):
+        self.rejected_total[reason] = self.rejected_total.get(reason, 0) + 1
+        raise AdmissionRejected(status, reason, max(1, math.ceil(retry_after)))
+
+    def _estimated_wait(self, position):
+        return position * self._avg_service / self.max_concurrent
+
+    def acquire(self, key=None, timeout=None):
+        """
+        获得处理名额; 失败时抛出 AdmissionRejected
+        """
+        budget = self.max_wait if timeout is None else min(self.max_wait, timeout)
+        deadline = time.monotonic() + budget
+
+        with self._cond:
+            # 1. 按餐厅公平: 只有其他餐厅的请求在排队时才限制
+            if key is not None and self.per_key_limit:
+                if self._per_key.get(key, 0) >= self.per_key_limit and self._others_waiting(key):
+                    self._reject(429, 'per_key_limit', self._avg_service)
+
+            # 2. 有空位且没人排队: 直接放行
+            if self._active < self.max_concurrent and not self._waiters:
+                self._admit(key)
+                return
+
+            # 3. 队列已满, 或者估算排队时间超过截止时间: 立即拒绝
+            position = len(self._waiters) + 1
+            estimated = self._estimated_wait(position)
+            if len(self._waiters) >= self.max_queue:
+                self._reject(503, 'queue_full', estimated)
+            if estimated > budget:
+                self._reject(503, 'deadline', estimated)
+
+            # 4. 排队等待
+            waiter = (object(), key)
+            self._waiters.append(waiter)
+            self._add_key(key)
+            self.peak_queue = max(self.peak_queue, len(self._waiters))
+            try:
+                while not (self._waiters[0] is waiter and self._active < self.max_concurrent):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._remove_key(key)
+                        self._reject(503, 'timeout', self._estimated_wait(len(self._waiters)))
+                    self._cond.wait(remaining)
+            finally:
+                self._waiters.remove(waiter)
+                # 队首变了, 叫醒下一个
+                self._cond.notify_all()
+
+            self._remove_key(key)
+            self._admit(key)
+
+    def _others_waiting(self, key):
+        return any(waiting_key != key for _, waiting_key in self._waiters)
+
+    def release(self, key=None, elapsed=None):
+        with self._cond:
+            self._active -= 1
+            self._remove_key(key)
+            if elapsed is not None:
+                self._avg_service = 0.9 * self._avg_service + 0.1 * elapsed
+            self._cond.notify_all()
+
+    def _admit(self, key):
+        self._active += 1
+        self._add_key(key)
+        self.admitted_total += 1
+
+    def _add_key(self, key):
+        if key is not None:
+            self._per_key[key] = self._per_key.get(key, 0) + 1
+
+    def _remove_key(self, key):
+        if key is not None:
+            count = self._per_key.get(key, 0) - 1
+            if count > 0:
+                self._per_key[key] = count
+            else:
+                self._per_key.pop(key, None)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "active": self._active,
+                "queued": len(self._waiters),
+                "peak_queued": self.peak_queue,
+                "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue,
+                "avg_service_ms": round(self._avg_service * 1000, 2),
+                "admitted_total": self.admitted_total,
+                "rejected_total": dict(self.rejected_total),
+                "busiest_keys": sorted(self._per_key.items(), key=lambda kv: -kv[1])[:5],
+            }
+
+
+def default_limits(config):
+    """
+    按每个 worker 的线程数 (SERVER_THREADS) 分配准入名额
+
+    排队中的请求同样占着一个线程, 所以菜单等接口的并发上限要小于线程数,
+    剩下的线程用来排队和处理登录等其他接口。如果上限不小于线程数,
+    请求根本到不了闸门, 全部堆在 gunicorn 的 accept 队列里, 429 / 503 都不会触发。
+
+    开启订单组提交 (ORDER_GROUP_COMMIT) 时, 下单请求线程只是在等后台线程提交, 不访问数据库,
+    并发上限按一批的大小 (ORDER_BATCH_MAX_SIZE) 放开, 否则每批永远只有一单。
+    """
+    threads = config['SERVER_THREADS']
+    if config.get('ORDER_GROUP_COMMIT'):
+        order_concurrent = config['ORDER_BATCH_MAX_SIZE']
+    else:
+        order_concurrent = max(1, threads // 4)  # 逐单提交: 写数据库, 并发小一些
+    menu_concurrent = max(1, threads // 2)       # 只读
+    max_queue = max(1, threads - 1)
+    per_key_limit = max(1, threads // 2)         # 有其他餐厅排队时, 单个餐厅最多占一半线程
+    return {
+        'order_create': {'max_concurrent': order_concurrent, 'max_queue': max_queue,
+                         'max_wait': 3.0, 'per_key_limit': max(per_key_limit, order_concurrent // 2)},
+        'menu': {'max_concurrent': menu_concurrent, 'max_queue': max_queue,
+                 'max_wait': 2.0, 'per_key_limit': per_key_limit},
+    }
+
+
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(app, name):
+    limiters = app.extensions.setdefault('admission', {})
+    limiter = limiters.get(name)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = limiters.get(name)
+            if limiter is None:
+                limits = app.config.get('ADMISSION_LIMITS') or default_limits(app.config)
+                limiter = AdmissionLimiter(name, **limits[name])
+                limiters[name] = limiter
+    return limiter
+
+
+def admission_stats(app):
+    """
+    所有闸门当前的队列深度等指标 (本 worker 进程)
+    """
+    return {name: limiter.stats() for name, limiter in app.extensions.get('admission', {}).items()}
+
+
+def _client_timeout():
+    value = request.headers.get('X-Request-Timeout')
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+def admission_limit(name, key_func=None):
+    """
+    视图装饰器: 用名为 name 的闸门保护这个接口
+    key_func 返回公平性分组的 key (例如 RestaurantID), 返回 None 表示不分组
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            app = current_app._get_current_object()
+            if not app.config.get('ADMISSION_CONTROL_ENABLED'):
+                return view(*args, **kwargs)
+
+            limiter = get_limiter(app, name)
+            key = key_func(*args, **kwargs) if key_func else None
+            try:
+                limiter.acquire(key, _client_timeout())
+            except AdmissionRejected as e:
+                response = jsonify({
+                    "error": "当前请求过多, 请稍后重试",
+                    "reason": e.reason
+                })
+                response.status_code = e.status
+                response.headers['Retry-After'] = str(e.retry_after)
+                return response
+
+            started = time.monotonic()
+            try:
+                return view(*args, **kwargs)
+            finally:
+                limiter.release(key, time.monotonic() - started)
+        return wrapper
+    return decorator
@@ -1,15 +1,22 @@
 # /app/api/admin_api.py
 from . import bp
-from app.tasks import run_ml_pipeline
-from flask import jsonify, current_app # <-- 【修改】导入 current_app
+from app.admission import admission_stats
+from app.auth import hashing_stats, session_required
+from app.bulk_import import ACCOUNT_KINDS, get_import_job, parse_accounts, start_import_job
+from app.tasks import run_ml_pipeline, get_pipeline_runs, get_pipeline_run
+from flask import jsonify, current_app, Response, request # <-- 【修改】导入 current_app
+import logging
+
+logger = logging.getLogger(__name__)
 
 @bp.route('/admin/run_kmeans', methods=['POST'])
+@session_required('admin')
 def run_kmeans_endpoint():
     """
     (演示按钮 API)
     立即触发 K-Means 聚类任务
     """
-    print("[API] K-Means run triggered by button.")
+    logger.info("[API] K-Means run triggered by button.")
     try:
         # 【核心修复】必须在这里为 K-Means 任务提供应用上下文！
         # 我们使用 'current_app.app_context()'
@@ -22,4 +29,107 @@ def run_kmeans_endpoint():
             return jsonify(result), 500
             
     except Exception as e:
-        return jsonify({"success": False, "error": f"An unexpected error occurred: {str(e)}"}), 500
\ No newline at end of file
+        return jsonify({"success": False, "error": f"An unexpected error occurred: {str(e)}"}), 500
+
+@bp.route('/admin/admission', methods=['GET'])
+@session_required('admin')
+def admission_metrics_endpoint():
+    """
+    准入控制指标: 各接口的处理中/排队数量、拒绝次数 (当前 worker 进程)
+    以及密码哈希线程池的使用情况
+    """
+    stats = admission_stats(current_app)
+    stats['password_hashing'] = hashing_stats(current_app)
+    return jsonify(stats), 200
+
+
+@bp.route('/admin/metrics', methods=['GET'])
+@session_required('admin')
+def metrics_endpoint():
+    """
+    Prometheus 抓取接口: 各路由的延迟直方图、SQL 条数、数据库耗时 + 准入控制队列深度
+    """
+    admission = admission_stats(current_app)
+    gauges = [
+        ("canteen_admission_active", "Requests currently admitted, per limiter.",
+         [({"limiter": name}, s["active"]) for name, s in admission.items()]),
+        ("canteen_admission_queued", "Requests waiting in the admission queue, per limiter.",
+         [({"limiter": name}, s["queued"]) for name, s in admission.items()]),
+    ]
+    hashing = hashing_stats(current_app)
+    if hashing is not None:
+        gauges.append(("canteen_password_hash_in_flight", "Password hashes running or queued on the hashing executor.",
+                       [({}, hashing["in_flight"])]))
+    text = current_app.extensions['request_metrics'].render_prometheus(gauges)
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+
+@bp.route('/admin/pipeline_runs', methods=['GET'])
+@session_required('admin')
+def pipeline_runs_endpoint():
+    """
+    K-Means 管道的历史运行记录 (摘要), 例如 /api/admin/pipeline_runs?limit=20
+    """
+    limit = request.args.get('limit', 20, type=int)
+    return jsonify(get_pipeline_runs(limit)), 200
+
+@bp.route('/admin/pipeline_runs/<int:run_id>', methods=['GET'])
+@session_required('admin')
+def pipeline_run_detail_endpoint(run_id):
+    """
+    某一次运行的完整阶段级 profile
+    """
+    profile = get_pipeline_run(run_id)
+    if profile is None:
+        return jsonify({"error": "未找到该运行记录"}), 404
+    return jsonify(profile), 200
+
+
+@bp.route('/admin/import/<kind>', methods=['POST'])
+@session_required('admin')
+def import_accounts_endpoint(kind):
+    """
+    批量导入账号 (kind: users / restaurants), 见 app/bulk_import.py
+    请求体: CSV (Content-Type: text/csv, 第一行是表头) 或 JSON 数组
+        users:       username, password, area
+        restaurants: username, password, name, location, image_url
+    导入在后台的命令行进程中执行, 这里立即返回 202 和 job_id,
+    用 GET /api/admin/import/jobs/<job_id> 查询进度和结果报告
+    """
+    if kind not in ACCOUNT_KINDS:
+        return jsonify({"error": f"不支持的账号类型: {kind}"}), 404
+
+    try:
+        if request.mimetype == 'text/csv':
+            rows = parse_accounts(request.get_data(as_text=True), 'csv')
+        else:
+            rows = parse_accounts(request.get_json(silent=True), 'json')
+    except (ValueError, UnicodeDecodeError) as e:
+        return jsonify({"error": f"无法解析导入数据: {e}"}), 400
+
+    if not rows:
+        return jsonify({"error": "没有要导入的账号"}), 400
+    if len(rows) > current_app.config['BULK_IMPORT_MAX_ROWS']:
+        return jsonify({"error": f"一次最多导入 {current_app.config['BULK_IMPORT_MAX_ROWS']} 个账号"}), 400
+
+    try:
+        job_id = start_import_job(kind, rows)
+    except Exception as e:
+        logger.exception("[API Import] Error: %s", e)
+        return jsonify({"error": str(e)}), 500
+    return jsonify({
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/admin/import/jobs/{job_id}"
+    }), 202
+
+@bp.route('/admin/import/jobs/<job_id>', methods=['GET'])
+@session_required('admin')
+def import_job_endpoint(job_id):
+    """
+    导入任务状态: queued / running / done (附结果报告) / failed
+    """
+    job = get_import_job(job_id)
+    if job is None:
+        return jsonify({"error": "未找到该导入任务"}), 404
+    return jsonify(job), 200
@@ -1,21 +1,33 @@
 # /app/api/order_api.py
 from . import bp
 from app import db
-from app.models import (
-    UserPriceLevel, MerchantDiscountRule, Dish, Order, OrderItem, UserBehaviorLog
-)
+from app.admission import admission_limit
+from app.auth import session_required, session_user_id
+from app.models import UserBehaviorLog
+from app.order_intake import OrderNotWritten, OrderStatusUnknown, submit_order
+from app.price_tables import get_restaurant_table
+from app.pricing import resolve_price_level
 from flask import request, jsonify
 from datetime import datetime
+import logging
+
+logger = logging.getLogger(__name__)
 
 @bp.route('/log/behavior', methods=['POST'])
+@session_required('user')
 def log_behavior():
     """
-    (闭环输入) 记录用户行为
+    (闭环输入) 记录当前登录用户的行为
     """
-    data = request.json
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "请求体必须是 JSON 对象"}), 400
+    user_id = session_user_id(data.get('user_id'))
+    if user_id is None:
+        return jsonify({"error": "user_id 与登录用户不一致"}), 403
     try:
         log = UserBehaviorLog(
-            UserID=data.get('user_id'),
+            UserID=user_id,
             RestaurantID=data.get('restaurant_id'),
             ActionType=data.get('action_type'),
             Timestamp=datetime.now()
@@ -27,94 +39,91 @@ def log_behavior():
         db.session.rollback()
         return jsonify({"error": f"Log failed: {str(e)}"}), 500
 
+def _order_restaurant_key():
+    data = request.get_json(silent=True)
+    restaurant_id = data.get('restaurant_id') if isinstance(data, dict) else None
+    # 只用标量做分组 key (list / dict 不能作为 dict 的 key), 非法值交给视图返回 400
+    return restaurant_id if isinstance(restaurant_id, (int, str)) else None
+
 @bp.route('/order/create', methods=['POST'])
+@session_required('user')
+@admission_limit('order_create', key_func=_order_restaurant_key)
 def create_order():
     """
-    (核心 API) 创建订单，并实时计算“个性化定价”
+    (核心 API) 为当前登录用户创建订单，并实时计算“个性化定价”
     """
-    data = request.json
-    user_id = data.get('user_id')
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return jsonify({"error": "请求体必须是 JSON 对象"}), 400
+    # 下单用户以会话令牌为准; 请求体中的 user_id (旧客户端) 必须与之一致
+    user_id = session_user_id(data.get('user_id'))
+    if user_id is None:
+        return jsonify({"error": "user_id 与登录用户不一致"}), 403
     restaurant_id = data.get('restaurant_id')
     dish_ids = data.get('dish_ids')
 
-    if not all([user_id, restaurant_id, dish_ids]):
-        return jsonify({"error": "缺少 user_id, restaurant_id 或 dish_ids"}), 400
+    if not all([restaurant_id, dish_ids]):
+        return jsonify({"error": "缺少 restaurant_id 或 dish_ids"}), 400
+    if not isinstance(restaurant_id, (int, str)) or not isinstance(dish_ids, list):
+        return jsonify({"error": "restaurant_id 或 dish_ids 格式错误"}), 400
 
     try:
         # --- 1. 获取用户的“价格等级”(ML 的输出) ---
-        user_level_entry = UserPriceLevel.query.get({
-            'UserID': user_id, 
-            'RestaurantID': restaurant_id
-        })
-        price_level = user_level_entry.PriceLevel if user_level_entry else 1
-        print(f"[Order] UserID {user_id} @ RestID {restaurant_id} -> PriceLevel: {price_level}")
+        #    从共享价格表中查 (见 app/pricing.py)
+        price_level = resolve_price_level(user_id, restaurant_id)
+        logger.debug("[Order] UserID %s @ RestID %s -> PriceLevel: %s", user_id, restaurant_id, price_level)
 
         # --- 2. 获取商家的“折扣规则”(业务规则) ---
-        discount_rule = MerchantDiscountRule.query.get({
-            'RestaurantID': restaurant_id, 
-            'PriceLevel': price_level
-        })
-        discount = discount_rule.Discount if discount_rule else 1.0
-        print(f"[Order] PriceLevel {price_level} -> Discount: {discount}")
+        #    餐厅价格表 (见 app/price_tables.py) 中已有 等级 -> 折扣 以及所有菜品原价
+        table = get_restaurant_table(restaurant_id)
+        discount = table.discount(price_level)
+        logger.debug("[Order] PriceLevel %s -> Discount: %s", price_level, discount)
 
-        # --- 3. 计算价格并准备订单详情 ---
+        # --- 3. 计算价格并准备订单详情 (不再查询 Dish) ---
         order_total_price = 0
-        order_items_to_create = []
+        order_items = []
         dish_counts = {}
         for dish_id in dish_ids:
             dish_counts[dish_id] = dish_counts.get(dish_id, 0) + 1
 
-        dishes_in_db = Dish.query.filter(Dish.DishID.in_(dish_counts.keys())).all()
-        dish_price_map = {d.DishID: d.BasePrice for d in dishes_in_db}
-
-        for dish_id, quantity in dish_counts.items():
-            base_price = dish_price_map.get(dish_id)
-            if base_price is None:
-                raise ValueError(f"菜品 ID {dish_id} 未找到")
+        # 菜品不属于该餐厅时抛出 ValueError("菜品 ID x 未找到")
+        line_prices = table.line_prices(list(dish_counts.keys()), discount).tolist()
 
-            final_price_per_item = base_price * discount
-            order_items_to_create.append(OrderItem(
-                DishID=dish_id,
-                Quantity=quantity,
-                FinalPricePerItem=final_price_per_item
-            ))
+        for (dish_id, quantity), final_price_per_item in zip(dish_counts.items(), line_prices):
+            order_items.append((dish_id, quantity, final_price_per_item))
             order_total_price += final_price_per_item * quantity
 
-        # --- 4. 创建主订单 (状态为 Pending) ---
-        new_order = Order(
-            UserID=user_id,
-            RestaurantID=restaurant_id,
-            Status='Pending', # (关键) 状态为“待处理”, 供商家确认
-            TotalPrice=order_total_price,
-            OrderTime=datetime.now(),
-            Items=order_items_to_create
-        )
-        db.session.add(new_order)
-
-        # --- 5. (闭环完成) 将“下单”行为写回日志 ---
-        order_log = UserBehaviorLog(
-            UserID=user_id,
-            RestaurantID=restaurant_id,
-            ActionType='order_placed',
-            Timestamp=datetime.now()
-        )
-        db.session.add(order_log)
-        
-        # --- 6. 提交事务 ---
-        db.session.commit()
+        # --- 4. 创建主订单 (状态为 Pending), 并将“下单”行为写回日志 ---
+        # --- 5. 提交事务 (逐单提交, 或开启 ORDER_GROUP_COMMIT 后合并提交) ---
+        order_id = submit_order({
+            "user_id": user_id,
+            "restaurant_id": restaurant_id,
+            "total_price": order_total_price,
+            "items": order_items
+        })
 
-        print(f"[Order] 成功创建订单 {new_order.OrderID}, 总价: {order_total_price}")
+        logger.info("[Order] 成功创建订单 %s, 总价: %s", order_id, order_total_price)
 
-        # --- 7. 返回“个性化”结果 ---
+        # --- 6. 返回“个性化”结果 ---
         return jsonify({
             "message": "下单成功!",
-            "order_id": new_order.OrderID,
-            "total_price": new_order.TotalPrice,
+            "order_id": order_id,
+            "total_price": order_total_price,
             "price_level_used": price_level,
             "discount_applied": discount
         }), 201
 
+    except OrderNotWritten as e:
+        # 组提交等待超时, 订单没有写入: 可以直接重试
+        response = jsonify({"error": str(e), "status": "not_written"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '1'
+        return response
+    except OrderStatusUnknown as e:
+        # 组提交等待超时, 订单可能已经写入: 客户端不要直接重试
+        logger.warning("[Order] 写入状态未知: user %s @ restaurant %s", user_id, restaurant_id)
+        return jsonify({"error": str(e), "status": "unknown"}), 504
     except Exception as e:
         db.session.rollback()
-        print(f"[Order] 失败: {str(e)}")
+        logger.warning("[Order] 失败: %s", e)
         return jsonify({"error": f"下单失败: {str(e)}"}), 500
\ No newline at end of file
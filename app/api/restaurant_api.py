@@ -2,9 +2,17 @@
 from . import bp  # 从 app/api/__init__.py 导入 'bp' 蓝图
 from app import db
 from app.models import Restaurant, MerchantDiscountRule, Order, OrderItem, User, Dish,UserPriceLevel
-from flask import request, jsonify
+from app.pricing import publish_price_table
+from app.row_mapping import RULE_ROWS, ORDER_FEED_ROWS, attach_order_items
+from app.order_status import MAX_BATCH_SIZE, transition_orders
+from app.auth import verify_password, hash_password, issue_session_token, current_session, session_required
+from flask import current_app, request, jsonify
 from sqlalchemy.orm import joinedload
 from sqlalchemy import func
+import logging
+
+logger = logging.getLogger(__name__)
+
 @bp.route('/restaurant/login', methods=['POST'])
 def restaurant_login():
     """
@@ -21,12 +29,16 @@ def restaurant_login():
     # 在真实项目中，应该查询哈希加密后的密码
     restaurant = Restaurant.query.filter_by(MerchantUsername=username).first()
 
-    if restaurant and restaurant.check_password(password):
+    # 密码校验在专用的哈希线程池中进行 (见 app/auth.py)
+    if restaurant and verify_password(restaurant.MerchantPasswordHash, password):
         # 登录成功，返回商家信息
         return jsonify({
             "message": "登录成功",
             "restaurant_id": restaurant.RestaurantID,
-            "name": restaurant.Name
+            "name": restaurant.Name,
+            # (新) 会话令牌, 之后的请求放在 Authorization: Bearer 头中
+            "token": issue_session_token('restaurant', restaurant.RestaurantID, restaurant.Name),
+            "expires_in": current_app.config['SESSION_TOKEN_MAX_AGE']
         }), 200
     else:
         # 登录失败
@@ -37,24 +49,18 @@ def get_rules(restaurant_id):
     """
     获取指定餐厅的当前折扣规则
     """
-    rules = MerchantDiscountRule.query.filter_by(RestaurantID=restaurant_id).all()
-
-    if not rules:
-        # 即使没有规则，也返回一个空列表，而不是 404
-        return jsonify([])
-
-    # 将查询结果序列化为 JSON
-    output = []
-    for rule in rules:
-        output.append({
-            "PriceLevel": rule.PriceLevel,
-            "Discount": rule.Discount
-        })
-    
     # 按 PriceLevel 排序，使其更易读
-    return jsonify(sorted(output, key=lambda x: x['PriceLevel']))
+    rows = db.session.execute(
+        RULE_ROWS.select()
+        .where(MerchantDiscountRule.RestaurantID == restaurant_id)
+        .order_by(MerchantDiscountRule.PriceLevel)
+    ).all()
+
+    # 即使没有规则，也返回一个空列表，而不是 404
+    return jsonify(RULE_ROWS.to_dicts(rows))
 
 @bp.route('/restaurant/<int:restaurant_id>/rules', methods=['POST'])
+@session_required('restaurant', id_arg='restaurant_id')
 def set_rules(restaurant_id):
     """
     (核心功能) 设置或更新一个餐厅的折扣规则
@@ -102,6 +108,9 @@ def set_rules(restaurant_id):
         
         db.session.add_all(new_rules)
         db.session.commit() # 提交事务
+
+        # 新规则对所有 worker 进程立即生效
+        publish_price_table()
         
         return jsonify({
             "message": f"成功为 {restaurant.Name} 更新了 {len(new_rules)} 条规则",
@@ -129,13 +138,16 @@ def restaurant_register():
     if Restaurant.query.filter_by(MerchantUsername=username).first():
         return jsonify({"error": "该商家用户名已被注册"}), 400
 
+    # 使用哈希 (在专用的哈希线程池中计算)
+    password_hash = hash_password(password)
+
     try:
         new_restaurant = Restaurant(
             MerchantUsername=username,
             Name=name,
-            Location=location
+            Location=location,
+            MerchantPasswordHash=password_hash
         )
-        new_restaurant.set_password(password) # 使用哈希
         
         db.session.add(new_restaurant)
         db.session.commit()
@@ -149,6 +161,7 @@ def restaurant_register():
         return jsonify({"error": f"注册失败: {str(e)}"}), 500
     
 @bp.route('/restaurant/<int:restaurant_id>/orders', methods=['GET'])
+@session_required('restaurant', id_arg='restaurant_id')
 def get_restaurant_orders(restaurant_id):
     """
     (新) 获取该餐厅的订单
@@ -157,33 +170,19 @@ def get_restaurant_orders(restaurant_id):
     status_filter = request.args.get('status')
     
     try:
-        query = Order.query.filter_by(RestaurantID=restaurant_id)
+        # 两次查询拿到全部数据 (订单+用户名, 订单明细+菜品名), 不再逐单懒加载
+        query = (
+            ORDER_FEED_ROWS.select()
+            .select_from(Order)
+            .outerjoin(User, User.UserID == Order.UserID)
+            .where(Order.RestaurantID == restaurant_id)
+        )
 
         if status_filter:
-            query = query.filter_by(Status=status_filter)
-            
-        orders = query.order_by(Order.OrderTime.desc()).limit(50).all()
-        
-        output = []
-        for order in orders:
-            user_name = order.User.Username if order.User else "未知用户"
+            query = query.where(Order.Status == status_filter)
             
-            items_output = []
-            for item in order.Items:
-                items_output.append({
-                    "dish_name": item.Dish.Name if item.Dish else "未知菜品",
-                    "quantity": item.Quantity,
-                    "final_price_per_item": item.FinalPricePerItem
-                })
-            
-            output.append({
-                "order_id": order.OrderID,
-                "user_name": user_name,
-                "status": order.Status,
-                "total_price": order.TotalPrice,
-                "order_time": order.OrderTime.isoformat(),
-                "items": items_output
-            })
+        rows = db.session.execute(query.order_by(Order.OrderTime.desc()).limit(50)).all()
+        output = attach_order_items(db.session, ORDER_FEED_ROWS.to_dicts(rows))
 
         return jsonify(output), 200
     except Exception as e:
@@ -191,35 +190,83 @@ def get_restaurant_orders(restaurant_id):
 
 
 @bp.route('/order/<int:order_id>/update_status', methods=['POST'])
+@session_required('restaurant')
 def update_order_status(order_id):
     """
     (新) 更新订单状态 (商家用)
     预期 JSON: { "status": "Confirmed" }
+    与批量接口走同一个 transition_orders, 同样受 app/order_status.py 中允许的流转约束
     """
-    data = request.json
+    data = request.json or {}
     new_status = data.get('status')
 
     if not new_status:
         return jsonify({"error": "缺少 'status'"}), 400
 
     try:
-        order = Order.query.get(order_id)
-        if not order:
+        # 只能修改自己餐厅的订单
+        result, = transition_orders(current_session()["id"], [order_id], new_status)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        logger.exception("[API UpdateStatus] Error: %s", e)
+        return jsonify({"error": str(e)}), 500
+
+    if not result["ok"]:
+        if result["error"] == "not_found":
             return jsonify({"error": "订单未找到"}), 404
-        
-        order.Status = new_status
-        db.session.commit()
-        
         return jsonify({
-            "message": "订单状态更新成功",
-            "order_id": order.OrderID,
-            "new_status": order.Status
-        }), 200
+            "error": f"订单当前状态为 {result['status']}, 不能改为 {new_status}",
+            "status": result["status"]
+        }), 409
+
+    return jsonify({
+        "message": "订单状态更新成功",
+        "order_id": order_id,
+        "new_status": new_status
+    }), 200
+    
+@bp.route('/restaurant/<int:restaurant_id>/orders/status', methods=['POST'])
+@session_required('restaurant', id_arg='restaurant_id')
+def batch_update_order_status(restaurant_id):
+    """
+    (新) 批量更新订单状态 (商家一键接单 / 出餐), 一个事务 + 一条 UPDATE
+    预期 JSON: { "order_ids": [1, 2, 3], "status": "Confirmed" }
+    允许的流转见 app/order_status.py (Pending -> Confirmed -> Completed, 以及取消)
+    """
+    data = request.json or {}
+    new_status = data.get('status')
+    order_ids = data.get('order_ids')
+
+    if not new_status:
+        return jsonify({"error": "缺少 'status'"}), 400
+    if not isinstance(order_ids, list) or not order_ids:
+        return jsonify({"error": "'order_ids' 必须是非空列表"}), 400
+    if not all(isinstance(oid, int) and not isinstance(oid, bool) for oid in order_ids):
+        return jsonify({"error": "'order_ids' 只能包含整数"}), 400
+    order_ids = list(dict.fromkeys(order_ids))  # 去重, 保持顺序
+    if len(order_ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"一次最多更新 {MAX_BATCH_SIZE} 个订单"}), 400
+
+    try:
+        results = transition_orders(restaurant_id, order_ids, new_status)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
-        db.session.rollback()
+        logger.exception("[API BatchStatus] Error: %s", e)
         return jsonify({"error": str(e)}), 500
-    
+
+    updated = sum(1 for r in results if r["ok"])
+    return jsonify({
+        "message": f"成功更新 {updated} / {len(results)} 个订单",
+        "status": new_status,
+        "updated": updated,
+        "results": results
+    }), 200
+
+
 @bp.route('/restaurant/<int:restaurant_id>/stats', methods=['GET'])
+@session_required('restaurant', id_arg='restaurant_id')
 def get_restaurant_stats(restaurant_id):
     """
     (新增) 真实数据接口：为前端 ECharts 提供数据库里的实时统计
@@ -261,5 +308,5 @@ def get_restaurant_stats(restaurant_id):
         return jsonify(stats_data), 200
 
     except Exception as e:
-        print(f"Stats Error: {e}")
+        logger.exception("Stats Error: %s", e)
         return jsonify({"error": str(e)}), 500
\ No newline at end of file
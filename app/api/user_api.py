@@ -1,8 +1,20 @@
 # /app/api/user_api.py
 from . import bp
 from app import db
-from app.models import User, Restaurant, Dish, UserPriceLevel, MerchantDiscountRule
-from flask import request, jsonify
+from app.models import User, Order, Restaurant
+from app.admission import admission_limit
+from app.auth import verify_password, hash_password, issue_session_token, current_session, session_required, session_user_id
+from app.price_tables import get_restaurant_table
+from app.json_provider import json_bytes_response
+from app.pricing import resolve_price_level
+from app.catalog import get_catalog, catalog_version, parse_cursor
+from app.search import search
+from app.row_mapping import USER_ORDER_ROWS, attach_order_items
+from sqlalchemy import String, tuple_, type_coerce
+from flask import current_app, request, jsonify
+import logging
+
+logger = logging.getLogger(__name__)
 
 @bp.route('/user/login', methods=['POST'])
 def user_login():
@@ -18,101 +30,227 @@ def user_login():
         return jsonify({"error": "缺少用户名或密码"}), 400
 
     user = User.query.filter_by(Username=username).first()
-    if user and user.check_password(password):
+    # 密码校验在专用的哈希线程池中进行 (见 app/auth.py)
+    if user and verify_password(user.PasswordHash, password):
         return jsonify({
             "message": "登录成功",
             "user_id": user.UserID,
-            "username": user.Username
+            "username": user.Username,
+            "area": user.Area,
+            # (新) 会话令牌, 之后的请求放在 Authorization: Bearer 头中
+            "token": issue_session_token('user', user.UserID, user.Username),
+            "expires_in": current_app.config['SESSION_TOKEN_MAX_AGE']
         }), 200
     else:
         # 登录失败
         return jsonify({"error": "用户名或密码错误"}), 401
 
+@bp.route('/session', methods=['GET'])
+@session_required()
+def get_session():
+    """
+    (新) 校验会话令牌并返回其中的身份信息 (只校验签名, 不查询数据库)
+    预期请求头: Authorization: Bearer <token>
+    """
+    return jsonify(current_session()), 200
+
 @bp.route('/restaurants', methods=['GET'])
 def get_all_restaurants():
     """
-    (页面核心) 获取所有餐厅列表
+    (页面核心) 获取餐厅列表 (游标分页)
+    数据来自内存中的餐厅目录快照 (见 app/catalog.py), 不查询数据库
+
+    预期请求: GET /api/restaurants?area=学生A区&location=西门&limit=20&cursor=0-12
+        area:     用户所在区域 (登录时返回), 该区域的餐厅排在前面
+        location: 只返回位置包含该字符串的餐厅
+        cursor:   上一页返回的 next_cursor
     """
+    # --- 1. 参数检查 ---
+    area = (request.args.get('area') or '').strip() or None
+    location = (request.args.get('location') or '').strip() or None
+    config = current_app.config
     try:
-        restaurants = Restaurant.query.all()
-        output = []
-        for r in restaurants:
-            output.append({
-                "id": r.RestaurantID,
-                "name": r.Name,
-                "location": r.Location
-            })
-        return jsonify(output), 200
+        limit = int(request.args.get('limit', config['CATALOG_PAGE_SIZE']))
+        limit = min(max(limit, 1), config['CATALOG_MAX_PAGE_SIZE'])
+        cursor = request.args.get('cursor')
+        cursor = parse_cursor(cursor) if cursor else None
+    except ValueError:
+        return jsonify({"error": "'limit' 或 'cursor' 格式错误"}), 400
+
+    try:
+        # --- 2. 从当前版本的目录中取一页 ---
+        catalog = get_catalog()
+        restaurants, next_cursor = catalog.page(limit, cursor, area=area, location=location)
+        return jsonify({
+            "restaurants": restaurants,
+            "next_cursor": next_cursor,
+            "version": catalog_version(catalog)
+        }), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
 @bp.route('/restaurant/<int:restaurant_id>/dishes', methods=['GET'])
+@session_required('user')
+@admission_limit('menu', key_func=lambda restaurant_id: restaurant_id)
 def get_dishes_for_restaurant(restaurant_id):
     """
     (核心 API - 已重构) 
-    获取指定餐厅的菜品, 并为指定用户实时计算“个性化价格”
+    获取指定餐厅的菜品, 并为当前登录用户实时计算“个性化价格”
     
-    预期请求: GET /api/restaurant/1/dishes?user_id=1
+    预期请求: GET /api/restaurant/1/dishes  (Authorization: Bearer <token>)
     """
     
-    # --- 1. 获取 UserID ---
-    user_id = request.args.get('user_id')
-    if not user_id:
-        return jsonify({"error": "缺少 'user_id' 参数"}), 400
-    
-    try:
-        user_id = int(user_id)
-    except ValueError:
-        return jsonify({"error": "'user_id' 必须是整数"}), 400
+    # --- 1. 获取 UserID (以会话令牌为准; 兼容旧客户端传的 ?user_id=, 但必须一致) ---
+    user_id = session_user_id(request.args.get('user_id'))
+    if user_id is None:
+        return jsonify({"error": "user_id 与登录用户不一致"}), 403
 
     try:
         # --- 2. 获取用户的“价格等级”(ML 的输出) ---
-        user_level_entry = UserPriceLevel.query.get({
-            'UserID': user_id, 
-            'RestaurantID': restaurant_id
-        })
-        
-        # 默认为 1 级 (新用户或低价值用户)
-        price_level = user_level_entry.PriceLevel if user_level_entry else 1
-        print(f"[API GetDishes] UserID {user_id} @ RestID {restaurant_id} -> PriceLevel: {price_level}")
+        #    从共享价格表中查 (见 app/pricing.py), 不访问数据库
+        #    默认为 1 级 (新用户或低价值用户)
+        price_level = resolve_price_level(user_id, restaurant_id)
+        logger.debug("[API GetDishes] UserID %s @ RestID %s -> PriceLevel: %s", user_id, restaurant_id, price_level)
 
         # --- 3. 获取商家的“折扣规则”(业务规则) ---
-        discount_rule = MerchantDiscountRule.query.get({
-            'RestaurantID': restaurant_id, 
-            'PriceLevel': price_level
-        })
-        
-        # 默认折扣为 1.0 (原价)
-        discount = discount_rule.Discount if discount_rule else 1.0
+        #    餐厅价格表 (见 app/price_tables.py) 中已经预编译好了 等级 -> 折扣
+        #    默认折扣为 1.0 (原价)
+        table = get_restaurant_table(restaurant_id)
+        discount = table.discount(price_level)
         # (生成您要的 "98%" "110%" 标签)
         discount_label = f"{int(discount * 100)}%"
-        print(f"[API GetDishes] PriceLevel {price_level} -> Discount: {discount} (Label: {discount_label})")
-        
-        # --- 4. 获取所有菜品, 并实时计算价格 ---
-        dishes = Dish.query.filter_by(RestaurantID=restaurant_id).all()
-        
-        output = []
-        for d in dishes:
-            # !!! 核心逻辑 !!!
-            base_price = d.BasePrice
-            final_price = base_price * discount
-
-            output.append({
-                "id": d.DishID,
-                "name": d.Name,
-                "image_url": d.image_url,         # (新) 返回图片 URL
-                "base_price": base_price,         # (新) 返回原价
-                "final_price": final_price,       # (新) 返回最终价
-                "discount_label": discount_label  # (新) 返回 "98%" 标签
-            })
+        logger.debug("[API GetDishes] PriceLevel %s -> Discount: %s (Label: %s)", price_level, discount, discount_label)
         
-        return jsonify(output), 200
+        # --- 4. 整个菜单的价格一次算完 (!!! 核心逻辑 !!!) ---
+        #    响应体是预先编码好的 JSON bytes (见 RestaurantPriceTable.menu_json)
+        return json_bytes_response(table.menu_json(discount, discount_label))
 
     except Exception as e:
-        print(f"[API GetDishes] Error: {str(e)}")
+        logger.exception("[API GetDishes] Error: %s", e)
         return jsonify({"error": f"服务器错误: {str(e)}"}), 500
     
+@bp.route('/search', methods=['GET'])
+@session_required('user')
+def search_catalog():
+    """
+    全校范围搜索菜品和餐厅 (FTS5 索引, 见 app/search.py)
+    菜品价格与 get_dishes_for_restaurant 使用同一套个性化折扣 (当前登录用户)
+
+    预期请求: GET /api/search?q=拉面&page=1&per_page=20  (Authorization: Bearer <token>)
+    """
+    # --- 1. 参数检查 ---
+    query = (request.args.get('q') or '').strip()
+    if not query:
+        return jsonify({"error": "缺少 'q' 参数"}), 400
+    user_id = session_user_id(request.args.get('user_id'))
+    if user_id is None:
+        return jsonify({"error": "user_id 与登录用户不一致"}), 403
+    try:
+        page = max(int(request.args.get('page', 1)), 1)
+        per_page = min(max(int(request.args.get('per_page', 20)), 1), 50)
+    except ValueError:
+        return jsonify({"error": "'page' 和 'per_page' 必须是整数"}), 400
+
+    try:
+        # --- 2. 按相关度取一页 (多取一条, 用来判断是否还有下一页) ---
+        rows = search(query, per_page + 1, (page - 1) * per_page)
+        has_more = len(rows) > per_page
+
+        # --- 3. 组装结果, 菜品按所属餐厅的折扣计算最终价 ---
+        discounts = {}  # RestaurantID -> (discount, discount_label)
+        results = []
+        for (kind, ref_id, restaurant_id, rank, dish_name, base_price, dish_image,
+             restaurant_name, location, restaurant_image) in rows[:per_page]:
+            if kind == 'restaurant':
+                results.append({
+                    "type": "restaurant",
+                    "id": ref_id,
+                    "name": restaurant_name,
+                    "location": location,
+                    "image_url": restaurant_image
+                })
+                continue
+
+            if restaurant_id not in discounts:
+                discount = get_restaurant_table(restaurant_id).discount(
+                    resolve_price_level(user_id, restaurant_id))
+                discounts[restaurant_id] = (discount, f"{int(discount * 100)}%")
+            discount, discount_label = discounts[restaurant_id]
+            results.append({
+                "type": "dish",
+                "id": ref_id,
+                "name": dish_name,
+                "image_url": dish_image,
+                "base_price": base_price,
+                "final_price": base_price * discount,
+                "discount_label": discount_label,
+                "restaurant_id": restaurant_id,
+                "restaurant_name": restaurant_name
+            })
+
+        return jsonify({
+            "query": query,
+            "page": page,
+            "per_page": per_page,
+            "has_more": has_more,
+            "results": results
+        }), 200
+
+    except Exception as e:
+        logger.exception("[API Search] Error: %s", e)
+        return jsonify({"error": f"服务器错误: {str(e)}"}), 500
+
+@bp.route('/user/<int:user_id>/orders', methods=['GET'])
+@session_required('user', id_arg='user_id')
+def get_user_orders(user_id):
+    """
+    (新) 用户的历史订单 (含明细和菜品名), 按下单时间倒序, keyset 分页
+    无论一页多少单, 都只有两次查询 (订单+餐厅名, 明细+菜品名)
+
+    预期请求: GET /api/user/1/orders?limit=20&cursor=2024-05-01 12:00:00,42
+        cursor: 上一页返回的 next_cursor ("下单时间,订单ID")
+    """
+    # --- 1. 参数检查 ---
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 50)
+        cursor = request.args.get('cursor')
+        if cursor:
+            order_time, order_id = cursor.rsplit(',', 1)
+            cursor = (order_time, int(order_id))
+    except ValueError:
+        return jsonify({"error": "'limit' 或 'cursor' 格式错误"}), 400
+
+    try:
+        # --- 2. 一页订单: 走覆盖索引 ix_order_user_history (UserID, OrderTime, OrderID, ...) ---
+        #    从上一页最后一单的 (OrderTime, OrderID) 之后接着读, 不用 OFFSET 跳过前面的行
+        #    游标中的时间是数据库里原样存储的字符串 (数据库默认值和 Python 写入的格式不同, 不能转成 datetime 再比较)
+        raw_time = type_coerce(Order.OrderTime, String)
+        query = (
+            USER_ORDER_ROWS.select(raw_time.label('order_time_raw'))
+            .select_from(Order)
+            .outerjoin(Restaurant, Restaurant.RestaurantID == Order.RestaurantID)
+            .where(Order.UserID == user_id)
+        )
+        if cursor:
+            query = query.where(tuple_(raw_time, Order.OrderID) < tuple_(*cursor))
+        rows = db.session.execute(
+            query.order_by(Order.OrderTime.desc(), Order.OrderID.desc()).limit(limit + 1)
+        ).all()
+
+        # --- 3. 一次查询补上所有订单的明细 ---
+        orders = attach_order_items(db.session, USER_ORDER_ROWS.to_dicts(rows[:limit]))
+
+        next_cursor = None
+        if len(rows) > limit:
+            last = rows[limit - 1]
+            next_cursor = f"{last[-1]},{orders[-1]['order_id']}"
+        return jsonify({"orders": orders, "next_cursor": next_cursor}), 200
+
+    except Exception as e:
+        logger.exception("[API UserOrders] Error: %s", e)
+        return jsonify({"error": str(e)}), 500
+
 @bp.route('/user/register', methods=['POST'])
 def user_register():
     data = request.json
@@ -127,10 +265,12 @@ def user_register():
     if User.query.filter_by(Username=username).first():
         return jsonify({"error": "该用户名已被注册"}), 400
 
+    # 使用哈希 (在专用的哈希线程池中计算)
+    password_hash = hash_password(password)
+
     # 创建新用户
     try:
-        new_user = User(Username=username, Area=area)
-        new_user.set_password(password) # 使用哈希
+        new_user = User(Username=username, Area=area, PasswordHash=password_hash)
         
         db.session.add(new_user)
         db.session.commit()
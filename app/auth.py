@@ -0,0 +1,234 @@
+# /app/auth.py
+"""
+登录相关: 密码哈希线程池 + 无状态会话令牌
+
+1. 密码哈希 (werkzeug 的 check_password_hash / generate_password_hash) 故意设计得很耗 CPU。
+   下课时大量同学同时登录, 如果在请求线程里直接算, 会把菜单、下单请求的 CPU 全部抢走。
+   这里每个 worker 进程有一个专用的小线程池 (PASSWORD_HASH_WORKERS 个线程),
+   同时最多算这么多个哈希 (hashlib 计算时会释放 GIL, 不影响其他请求线程);
+   排队的请求也有上限 (PASSWORD_HASH_MAX_PENDING), 超过时直接返回 503 + Retry-After。
+
+2. 会话令牌: 登录成功后签发一个签名令牌 (itsdangerous, 用 SECRET_KEY 做 HMAC),
+   之后的请求带上 "Authorization: Bearer <token>", 只需校验签名和有效期 (微秒级),
+   不需要查询 User / Restaurant 表, 客户端也不用频繁重新登录。
+"""
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from functools import partial, wraps
+
+from flask import current_app, g, jsonify, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from werkzeug.security import check_password_hash, generate_password_hash
+
+TOKEN_SALT = 'canteen-session'
+
+
+class HashingBusy(Exception):
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class PasswordHasher:
+    """
+    有界的密码哈希线程池 (每个 worker 进程一个)
+    """
+
+    def __init__(self, max_workers, max_pending, timeout):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='password-hash')
+        # 计算中 + 排队中 的总名额
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        # 统计
+        self.completed_total = 0
+        self.rejected_total = {}  # reason -> count
+
+    def _reject(self, reason):
+        with self._lock:
+            self.rejected_total[reason] = self.rejected_total.get(reason, 0) + 1
+        raise HashingBusy(reason, max(1, math.ceil(self.timeout / 2)))
+
+    def _done(self, future):
+        with self._lock:
+            self._in_flight -= 1
+            self.completed_total += 1
+        self._slots.release()
+
+    def run(self, func, *args):
+        """
+        在线程池中执行 func(*args) 并等待结果; 队列已满或等待超时时抛出 HashingBusy
+        """
+        if not self._slots.acquire(blocking=False):
+            self._reject('queue_full')
+        with self._lock:
+            self._in_flight += 1
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._done)
+        try:
+            return future.result(self.timeout)
+        except FutureTimeout:
+            future.cancel()  # 还没开始算的直接取消; 已经在算的算完后释放名额
+            self._reject('timeout')
+
+    def stats(self):
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_pending": self.max_pending,
+                "in_flight": self._in_flight,
+                "completed_total": self.completed_total,
+                "rejected_total": dict(self.rejected_total),
+            }
+
+
+_hasher_lock = threading.Lock()
+
+
+def _get_hasher():
+    app = current_app._get_current_object()
+    hasher = app.extensions.get('password_hasher')
+    if hasher is None:
+        with _hasher_lock:
+            hasher = app.extensions.get('password_hasher')
+            if hasher is None:
+                hasher = PasswordHasher(
+                    app.config['PASSWORD_HASH_WORKERS'],
+                    app.config['PASSWORD_HASH_MAX_PENDING'],
+                    app.config['PASSWORD_HASH_TIMEOUT']
+                )
+                app.extensions['password_hasher'] = hasher
+    return hasher
+
+
+def verify_password(password_hash, password):
+    """
+    (替代 model.check_password) 在哈希线程池中校验密码
+    """
+    return _get_hasher().run(check_password_hash, password_hash, password)
+
+
+def hash_password(password):
+    """
+    (替代 model.set_password) 在哈希线程池中生成密码哈希
+    """
+    return _get_hasher().run(generate_password_hash, password)
+
+
+def hashing_stats(app):
+    hasher = app.extensions.get('password_hasher')
+    return hasher.stats() if hasher is not None else None
+
+
+def _reset_after_fork(app):
+    # fork 之后线程池中的线程不会被复制到子进程: 丢弃父进程的线程池, 子进程第一次使用时重新创建
+    global _hasher_lock
+    _hasher_lock = threading.Lock()
+    app.extensions.pop('password_hasher', None)
+
+
+# --- 会话令牌 ---
+
+def _serializer():
+    serializer = current_app.extensions.get('session_serializer')
+    if serializer is None:
+        serializer = URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt=TOKEN_SALT)
+        current_app.extensions['session_serializer'] = serializer
+    return serializer
+
+
+def issue_session_token(kind, subject_id, name):
+    """
+    kind: 'user' 或 'restaurant'
+    """
+    return _serializer().dumps({"kind": kind, "id": subject_id, "name": name})
+
+
+def verify_session_token(token):
+    """
+    校验签名和有效期, 返回令牌中的会话信息; 无效或过期时返回 None
+    """
+    try:
+        return _serializer().loads(token, max_age=current_app.config['SESSION_TOKEN_MAX_AGE'])
+    except BadSignature:  # 包括 SignatureExpired
+        return None
+
+
+def current_session():
+    """
+    当前请求携带的会话 (Authorization: Bearer <token>); 没有或无效时返回 None
+    """
+    if 'auth_session' not in g:
+        header = request.headers.get('Authorization', '')
+        token = header[7:].strip() if header.startswith('Bearer ') else None
+        g.auth_session = verify_session_token(token) if token else None
+    return g.auth_session
+
+
+def is_admin(session):
+    """
+    管理员: 用户名在 ADMIN_USERNAMES 中的用户 (每次请求都检查, 从名单中删除后立即失效)
+    """
+    return (session is not None and session.get("kind") == 'user'
+            and session.get("name") in current_app.config['ADMIN_USERNAMES'])
+
+
+def session_required(kind=None, id_arg=None):
+    """
+    视图装饰器: 要求请求带有效的会话令牌
+    kind:   限定令牌类型 ('user' / 'restaurant'); 'admin' 表示管理员 (见 is_admin)
+    id_arg: URL 参数名 (例如 'user_id'), 要求令牌中的 id 与之相同, 只能访问自己的数据
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            session = current_session()
+            if session is None:
+                return jsonify({"error": "未登录或登录已过期"}), 401
+            if kind == 'admin':
+                if not is_admin(session):
+                    return jsonify({"error": "需要管理员权限"}), 403
+            elif kind is not None and session.get("kind") != kind:
+                return jsonify({"error": "无权访问"}), 403
+            if id_arg is not None and session.get("id") != kwargs.get(id_arg):
+                return jsonify({"error": "无权访问"}), 403
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def session_user_id(claimed=None):
+    """
+    (配合 session_required('user')) 当前登录用户的 ID, 以令牌为准
+    客户端另外传了 user_id (claimed) 且与令牌不一致时返回 None, 调用方应返回 403
+    """
+    user_id = current_session()["id"]
+    if claimed not in (None, '') and str(claimed) != str(user_id):
+        return None
+    return user_id
+
+
+def _hashing_busy(e):
+    response = jsonify({
+        "error": "当前登录请求过多, 请稍后重试",
+        "reason": e.reason
+    })
+    response.status_code = 503
+    response.headers['Retry-After'] = str(e.retry_after)
+    return response
+
+
+def init_auth(app):
+    """
+    在 create_app 中调用
+    """
+    app.register_error_handler(HashingBusy, _hashing_busy)
+    # 多进程部署 (serve.py) 时每个 worker 使用自己的线程池
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=partial(_reset_after_fork, app))
@@ -0,0 +1,282 @@
+# /app/bulk_import.py
+"""
+批量导入账号 (新生用户 / 一批商家)
+
+逐个调用 user_register 意味着每个账号: 一次唯一性查询 + 一次串行的密码哈希 (几十毫秒) + 一次 commit。
+这里一次导入整个文件:
+    1. 解析 CSV / JSON, 检查必填字段和文件内重复的用户名
+    2. 一条集合查询找出数据库中已经存在的用户名 (SQLite: json_each, 只绑定一个参数)
+    3. 密码哈希分发到进程池 (ProcessPoolExecutor), 用满所有 CPU 核心
+    4. 按 BULK_IMPORT_BATCH_SIZE 分批用 Core insert 写入, 每批一个事务
+       哈希结果按顺序一批一批地返回, 写入和后面批次的哈希同时进行
+
+进程池只在命令行进程 (scripts/import_accounts.py) 中创建。Web worker 是多线程的,
+在请求线程里创建进程池不安全, 所以 POST /api/admin/import 只是用 start_import_job
+启动一个命令行进程, 立即返回 job_id, 进度和结果报告写在 BULK_IMPORT_JOB_DIR/<job_id>.json。
+
+绕过了 ORM, 所以导入商家之后要自己同步搜索索引 (app/search.py) 和餐厅目录快照 (app/catalog.py)。
+"""
+import csv
+import io
+import json
+import logging
+import multiprocessing
+import os
+import re
+import secrets
+import subprocess
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from flask import current_app
+from sqlalchemy import insert, select, text
+from sqlalchemy.exc import IntegrityError
+from werkzeug.security import generate_password_hash
+
+from . import db
+from .catalog import publish_catalog
+from .models import Restaurant, User
+from .search import index_restaurants
+
+logger = logging.getLogger(__name__)
+
+# 每种账号: 模型, 用户名列, 密码哈希列, 必填字段, (字段 -> 列) 映射
+ACCOUNT_KINDS = {
+    'users': {
+        'model': User,
+        'username': User.Username,
+        'password_column': 'PasswordHash',
+        'required': ('username', 'password'),
+        'fields': {'username': 'Username', 'area': 'Area'},
+    },
+    'restaurants': {
+        'model': Restaurant,
+        'username': Restaurant.MerchantUsername,
+        'password_column': 'MerchantPasswordHash',
+        'required': ('username', 'password', 'name'),
+        'fields': {'username': 'MerchantUsername', 'name': 'Name',
+                   'location': 'Location', 'image_url': 'image_url'},
+    },
+}
+
+_IN_CHUNK = 500  # 非 SQLite 数据库: IN 列表分块大小
+
+
+def parse_accounts(payload, fmt):
+    """
+    payload: CSV 文本 (第一行是表头) 或 JSON 数组 (文本或已解析的 list)
+    返回 dict 列表 (key 都是小写字段名, 值去掉首尾空白)
+    """
+    if fmt == 'csv':
+        rows = list(csv.DictReader(io.StringIO(payload)))
+    elif fmt == 'json':
+        rows = json.loads(payload) if isinstance(payload, (str, bytes)) else payload
+        if not isinstance(rows, list) or not all(isinstance(r, dict) for r in rows):
+            raise ValueError("JSON 必须是对象数组")
+    else:
+        raise ValueError(f"不支持的格式: {fmt}")
+
+    return [
+        {str(k).strip().lower(): (v.strip() if isinstance(v, str) else v)
+         for k, v in row.items() if k is not None}
+        for row in rows
+    ]
+
+
+def _existing_usernames(column, usernames):
+    """
+    一条集合查询: 这些用户名中哪些已经存在
+    """
+    if db.engine.dialect.name == 'sqlite':
+        table = column.table.name
+        stmt = text(
+            f'SELECT "{column.name}" FROM "{table}" '
+            f'WHERE "{column.name}" IN (SELECT value FROM json_each(:names))'
+        )
+        return set(db.session.execute(stmt, {"names": json.dumps(usernames)}).scalars())
+
+    existing = set()
+    for i in range(0, len(usernames), _IN_CHUNK):
+        existing.update(db.session.execute(
+            select(column).where(column.in_(usernames[i:i + _IN_CHUNK]))
+        ).scalars())
+    return existing
+
+
+def _validate(spec, rows):
+    """
+    返回 (可以导入的行, 跳过的行)
+    """
+    accepted, skipped, seen = [], [], set()
+    for i, row in enumerate(rows, start=1):
+        missing = [f for f in spec['required'] if not row.get(f)]
+        username = row.get('username')
+        if missing:
+            skipped.append({"row": i, "username": username, "error": f"缺少字段: {', '.join(missing)}"})
+        elif username in seen:
+            skipped.append({"row": i, "username": username, "error": "文件中重复"})
+        else:
+            seen.add(username)
+            accepted.append((i, row))
+
+    if accepted:
+        existing = _existing_usernames(spec['username'], [row['username'] for _, row in accepted])
+        if existing:
+            skipped.extend({"row": i, "username": row['username'], "error": "用户名已存在"}
+                           for i, row in accepted if row['username'] in existing)
+            accepted = [(i, row) for i, row in accepted if row['username'] not in existing]
+    return accepted, skipped
+
+
+def _hash_pool(processes):
+    # 不用 fork: 调用进程里已经有日志后台线程等其他线程, fork 会把它们持有的锁以加锁状态复制到子进程。
+    # forkserver 从一个干净的单线程服务进程 fork 出哈希进程 (没有 forkserver 的平台用 spawn)。
+    # 两者都会在子进程中重新导入 __main__, 所以只能在入口模块导入时没有副作用的进程里使用
+    # (scripts/import_accounts.py); run.py / serve.py 在导入时就会 create_app
+    method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+    return ProcessPoolExecutor(max_workers=processes, mp_context=multiprocessing.get_context(method))
+
+
+def _insert_batch(spec, batch, hashes):
+    model = spec['model']
+    values = []
+    for (_, row), password_hash in zip(batch, hashes):
+        record = {column: row.get(field) for field, column in spec['fields'].items()}
+        record[spec['password_column']] = password_hash
+        values.append(record)
+
+    try:
+        if model is Restaurant:
+            # 同一事务内同步搜索索引
+            inserted = db.session.execute(
+                insert(Restaurant).returning(Restaurant.RestaurantID, Restaurant.Name, Restaurant.Location),
+                values
+            ).all()
+            index_restaurants(db.session.connection(), [tuple(r) for r in inserted])
+        else:
+            db.session.execute(insert(model), values)
+        db.session.commit()
+        return None
+    except IntegrityError as e:
+        # 通常是导入期间有人用同样的用户名注册了; 这一批整体跳过
+        db.session.rollback()
+        return str(e.orig)
+
+
+def import_accounts(kind, rows, processes=None, batch_size=None):
+    """
+    导入一批账号, 返回结果报告:
+        {"kind", "total", "created", "skipped": [...], "failed_batches": [...], "duration_ms"}
+    会创建哈希进程池, 只在命令行进程中调用 (Web 请求用 start_import_job)
+    """
+    spec = ACCOUNT_KINDS.get(kind)
+    if spec is None:
+        raise ValueError(f"不支持的账号类型: {kind}")
+    config = current_app.config
+    processes = processes or config.get('BULK_IMPORT_PROCESSES') or os.cpu_count() or 1
+    batch_size = batch_size or config['BULK_IMPORT_BATCH_SIZE']
+    started = time.perf_counter()
+
+    # --- 1. 校验 + 一条查询排除已存在的用户名 ---
+    accepted, skipped = _validate(spec, rows)
+    logger.info("[Import] %s: %d rows, %d to import, %d skipped.", kind, len(rows), len(accepted), len(skipped))
+
+    # --- 2. 多进程哈希, 按批写入 ---
+    created = 0
+    failed_batches = []
+    if accepted:
+        passwords = [str(row['password']) for _, row in accepted]
+        chunksize = max(1, min(64, len(passwords) // (processes * 4) or 1))
+        with _hash_pool(processes) as pool:
+            hashes = pool.map(generate_password_hash, passwords, chunksize=chunksize)
+            for start in range(0, len(accepted), batch_size):
+                batch = accepted[start:start + batch_size]
+                batch_hashes = [next(hashes) for _ in batch]
+                error = _insert_batch(spec, batch, batch_hashes)
+                if error is None:
+                    created += len(batch)
+                else:
+                    failed_batches.append({"first_row": batch[0][0], "last_row": batch[-1][0], "error": error})
+                    logger.warning("[Import] Batch rows %d-%d failed: %s", batch[0][0], batch[-1][0], error)
+
+    # --- 3. 新商家对所有 worker 进程可见 ---
+    if kind == 'restaurants' and created:
+        publish_catalog()
+
+    duration_ms = round((time.perf_counter() - started) * 1000, 1)
+    logger.info("[Import] %s: created %d accounts in %.1f ms.", kind, created, duration_ms)
+    return {
+        "kind": kind,
+        "total": len(rows),
+        "created": created,
+        "skipped": sorted(skipped, key=lambda s: s["row"]),
+        "failed_batches": failed_batches,
+        "duration_ms": duration_ms,
+    }
+
+
+# --- 后台导入任务 (Web 接口) ---
+
+_JOB_ID = re.compile(r'[0-9a-f]{16}')
+_running = []  # 本进程启动的导入进程, 结束后回收
+
+
+def _job_path(job_id):
+    return os.path.join(current_app.config['BULK_IMPORT_JOB_DIR'], f"{job_id}.json")
+
+
+def write_job_report(path, report):
+    """
+    原子地写入任务状态文件 (其他 worker 进程可能正在读)
+    """
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _reap_jobs():
+    _running[:] = [process for process in _running if process.poll() is None]
+
+
+def start_import_job(kind, rows):
+    """
+    启动一个命令行进程 (BULK_IMPORT_COMMAND) 执行导入, 返回 job_id
+    账号数据 (含明文密码) 通过 stdin 传给子进程, 不写入磁盘
+    """
+    config = current_app.config
+    job_id = secrets.token_hex(8)
+    os.makedirs(config['BULK_IMPORT_JOB_DIR'], exist_ok=True)
+    path = _job_path(job_id)
+    write_job_report(path, {"kind": kind, "status": "queued", "total": len(rows)})
+
+    _reap_jobs()
+    process = subprocess.Popen(
+        [*config['BULK_IMPORT_COMMAND'], kind, '-', '--format', 'json', '--report', path],
+        stdin=subprocess.PIPE, stdout=subprocess.DEVNULL,
+        start_new_session=True  # 重启 worker 时不会连带杀掉正在进行的导入
+    )
+    try:
+        with process.stdin:
+            process.stdin.write(json.dumps(rows, ensure_ascii=False).encode('utf-8'))
+    except OSError as e:
+        # 子进程启动后立即退出 (例如命令配置错误)
+        write_job_report(path, {"kind": kind, "status": "failed", "total": len(rows), "error": str(e)})
+    _running.append(process)
+    logger.info("[Import] Started job %s (%s, %d rows) in pid %d.", job_id, kind, len(rows), process.pid)
+    return job_id
+
+
+def get_import_job(job_id):
+    """
+    任务状态: {"job_id", "kind", "status": queued / running / done / failed, ...}; 不存在时返回 None
+    """
+    _reap_jobs()
+    if not _JOB_ID.fullmatch(job_id):
+        return None
+    try:
+        with open(_job_path(job_id), encoding='utf-8') as f:
+            report = json.load(f)
+    except FileNotFoundError:
+        return None
+    return {"job_id": job_id, **report}
@@ -0,0 +1,180 @@
+# /app/catalog.py
+"""
+餐厅目录快照 (GET /api/restaurants)
+
+餐厅列表是用户首页每次都要加载的数据, 而餐厅信息只在商家注册或修改资料时才会变化。
+这里把整个目录编码成 JSON 快照, 用 SharedSnapshot (见 app/shared_snapshot.py)
+共享给所有 worker 进程; 每个进程解码一次后缓存在内存中, 请求中不再查询数据库。
+
+版本号 = 快照文件的 stamp + 本进程发布次数 (与 app/pricing.py 的 price_generation 相同),
+任何 session 提交了 Restaurant 的增删改 (restaurant_register、资料修改 ...) 都会重新发布快照。
+
+列表接口的分页用游标 (cursor): 上一页最后一个餐厅的排序键, 与 offset 不同,
+翻页期间有餐厅注册也不会出现重复。
+"""
+import logging
+import threading
+from bisect import bisect_right
+
+from flask import current_app
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from . import db
+from .json_provider import dumps_bytes
+from .models import Restaurant
+from .shared_snapshot import SharedSnapshot
+
+logger = logging.getLogger(__name__)
+
+_snapshots = {}  # path -> SharedSnapshot
+_catalog = {}    # 'current' -> RestaurantCatalog
+_build_lock = threading.Lock()
+_local_generation = 0
+
+
+class RestaurantCatalog:
+    """
+    一个目录版本 (只读)
+    restaurants: 按 RestaurantID 升序的 dict 列表 (id / name / location / image_url)
+    """
+
+    def __init__(self, version, rows):
+        self.version = version
+        self.restaurants = [
+            {"id": rid, "name": name, "location": location, "image_url": image_url}
+            for rid, name, location, image_url in rows
+        ]
+        self.restaurants.sort(key=lambda r: r["id"])
+
+    def page(self, limit, cursor=None, area=None, location=None):
+        """
+        返回 (本页餐厅, next_cursor)
+        location: 只保留 Location 包含该字符串的餐厅 (筛选)
+        area:     用户所在区域 (User.Area), Location 与之匹配的餐厅排在前面并标记 nearby
+        cursor:   "<0|1>-<RestaurantID>", 即上一页最后一项的排序键
+        """
+        candidates = self.restaurants
+        if location:
+            candidates = [r for r in candidates if r["location"] and location in r["location"]]
+
+        if area:
+            keyed = sorted(((0 if _is_nearby(r, area) else 1, r["id"]), r) for r in candidates)
+        else:
+            keyed = [((1, r["id"]), r) for r in candidates]
+
+        start = 0
+        if cursor is not None:
+            start = bisect_right(keyed, cursor, key=lambda item: item[0])
+
+        chunk = keyed[start:start + limit]
+        items = [dict(r, nearby=key[0] == 0) if area else r for key, r in chunk]
+        next_cursor = None
+        if start + limit < len(keyed):
+            rank, rid = chunk[-1][0]
+            next_cursor = f"{rank}-{rid}"
+        return items, next_cursor
+
+
+def _is_nearby(restaurant, area):
+    location = restaurant["location"]
+    return bool(location) and (area in location or location in area)
+
+
+def parse_cursor(value):
+    """
+    解析客户端传回的游标; 格式错误时抛出 ValueError
+    """
+    rank, rid = value.split('-', 1)
+    return int(rank), int(rid)
+
+
+def _snapshot():
+    path = current_app.config['CATALOG_SNAPSHOT_PATH']
+    snapshot = _snapshots.get(path)
+    if snapshot is None:
+        snapshot = _snapshots.setdefault(path, SharedSnapshot(path))
+    return snapshot
+
+
+def _load_rows(conn):
+    return conn.execute(select(
+        Restaurant.RestaurantID, Restaurant.Name, Restaurant.Location, Restaurant.image_url
+    )).all()
+
+
+def publish_catalog():
+    """
+    从数据库重新读取餐厅目录, 原子地替换共享快照
+    (必须在事务 commit 之后、应用上下文中调用)
+    """
+    global _local_generation
+    _local_generation += 1
+    if not current_app.config.get('CATALOG_SNAPSHOT_ENABLED'):
+        return
+
+    snapshot = _snapshot()
+    with snapshot.publish_lock(), db.engine.connect() as conn:
+        rows = _load_rows(conn)
+        snapshot.publish(dumps_bytes([list(r) for r in rows]))
+    logger.info("[Catalog] Published restaurant catalog: %d restaurants.", len(rows))
+
+
+def get_catalog():
+    """
+    返回当前版本的 RestaurantCatalog (版本变化时重新解码 / 查询)
+    """
+    stamp, buffer = None, None
+    if current_app.config.get('CATALOG_SNAPSHOT_ENABLED'):
+        stamp, buffer = _snapshot().read()
+    generation = (stamp, _local_generation)
+
+    catalog = _catalog.get('current')
+    if catalog is not None and catalog.version == generation:
+        return catalog
+
+    with _build_lock:
+        catalog = _catalog.get('current')
+        if catalog is not None and catalog.version == generation:
+            return catalog
+        if buffer is not None:
+            rows = current_app.json.loads(bytes(buffer))
+        else:
+            # 快照未启用 (或还没有发布): 直接查询, 按本进程的版本号缓存
+            with db.engine.connect() as conn:
+                rows = _load_rows(conn)
+        catalog = RestaurantCatalog(generation, rows)
+        _catalog['current'] = catalog
+        return catalog
+
+
+def catalog_version(catalog):
+    """
+    对外暴露的版本字符串 (响应中的 "version" 字段)
+    """
+    stamp, local = catalog.version
+    if stamp is None:
+        return f"local-{local}"
+    return f"{stamp[0]:x}.{stamp[1]:x}"
+
+
+# --- 餐厅变化时自动刷新 ---
+# 与 app/price_tables.py 中的 Dish 事件相同: 提交之后重新发布快照
+
+@event.listens_for(Session, 'after_flush')
+def _mark_restaurant_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Restaurant):
+            session.info['restaurants_changed'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_on_restaurant_commit(session):
+    if session.info.pop('restaurants_changed', False):
+        publish_catalog()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_restaurant_changes(session):
+    session.info.pop('restaurants_changed', None)
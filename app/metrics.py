@@ -0,0 +1,272 @@
+# /app/metrics.py
+"""
+请求级别的性能统计
+
+对每个路由 (按 URL 规则, 例如 /api/restaurant/<int:restaurant_id>/dishes) 记录:
+    - 延迟直方图
+    - 每个请求执行的 SQL 语句条数
+    - 每个请求花在数据库上的累计时间
+数据来自 Flask 的 before/after_request 钩子和 SQLAlchemy 引擎的 cursor_execute 事件,
+通过 /api/admin/metrics 以 Prometheus 文本格式导出。
+
+另外可以打开 "慢请求日志" (SLOW_REQUEST_LOG_MS): 超过阈值的请求会把它执行过的 SQL 打印出来。
+
+多进程部署时每次抓取只会落到某一个 worker 上。为了让计数器单调递增:
+    - 每个 worker 每隔 METRICS_FLUSH_INTERVAL 秒把自己的累计值写到 METRICS_DIR/worker-<pid>.json
+    - 抓取时先写出本进程的最新值, 再把目录中所有文件加起来
+    - 退出 (被重启) 的 worker 的文件保留, 它的计数不会从总数中消失; serve.py 启动时清空目录
+准入控制队列深度等 gauge 仍然是被抓取的那个 worker 的值, 带 worker="<pid>" 标签。
+"""
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+
+from . import db
+
+logger = logging.getLogger(__name__)
+
+# 延迟直方图的桶 (秒)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class RouteStats:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.latency_sum = 0.0
+        self.sql_count = 0
+        self.db_time = 0.0
+        self.errors = 0
+
+    def observe(self, elapsed, sql_count, db_time, status):
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if elapsed <= bound:
+                self.buckets[i] += 1
+        self.count += 1
+        self.latency_sum += elapsed
+        self.sql_count += sql_count
+        self.db_time += db_time
+        if status >= 500:
+            self.errors += 1
+
+    def to_list(self):
+        return [self.buckets, self.count, self.latency_sum, self.sql_count, self.db_time, self.errors]
+
+    def merge(self, values):
+        buckets, count, latency_sum, sql_count, db_time, errors = values
+        self.buckets = [a + b for a, b in zip(self.buckets, buckets)]
+        self.count += count
+        self.latency_sum += latency_sum
+        self.sql_count += sql_count
+        self.db_time += db_time
+        self.errors += errors
+
+
+class RequestMetrics:
+    def __init__(self, directory=None, flush_interval=1.0):
+        self._lock = threading.Lock()
+        self.routes = {}  # (method, route) -> RouteStats
+        # 多进程汇总 (directory 为 None 时只统计本进程)
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self._dirty = False
+        self._flusher_started = False
+        self._flush_lock = threading.Lock()  # 后台线程和抓取请求可能同时写文件, 旧值不能覆盖新值
+
+    def observe(self, method, route, elapsed, sql_count, db_time, status):
+        with self._lock:
+            stats = self.routes.get((method, route))
+            if stats is None:
+                stats = self.routes[(method, route)] = RouteStats()
+            stats.observe(elapsed, sql_count, db_time, status)
+            self._dirty = True
+        if self.directory is not None and not self._flusher_started:
+            self._start_flusher()
+
+    # --- 多进程汇总 ---
+    def _start_flusher(self):
+        # 每个进程第一次统计时启动自己的后台线程
+        with self._lock:
+            if self._flusher_started:
+                return
+            self._flusher_started = True
+        threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True).start()
+
+    def _after_fork(self):
+        # fork 之后后台线程不会被复制到子进程; 父进程的累计值已经在父进程自己的文件里, 子进程从零开始
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.routes = {}
+        self._dirty = False
+        self._flusher_started = False
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._dirty:
+                self.flush()
+
+    def flush(self):
+        """
+        把本进程的累计值原子地写到 worker-<pid>.json
+        """
+        with self._flush_lock:
+            with self._lock:
+                self._dirty = False
+                data = [[method, route, *s.to_list()] for (method, route), s in self.routes.items()]
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"worker-{os.getpid()}.json")
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f)
+            os.replace(tmp_path, path)
+
+    def collect(self):
+        """
+        所有 worker (包括已经退出的) 的累计值之和: {(method, route): RouteStats}
+        """
+        if self.directory is None:
+            with self._lock:
+                merged = {}
+                for key, s in self.routes.items():
+                    merged[key] = RouteStats()
+                    merged[key].merge(s.to_list())
+                return merged
+
+        self.flush()
+        merged = {}
+        for path in glob.glob(os.path.join(self.directory, 'worker-*.json')):
+            try:
+                with open(path, encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            for method, route, *values in data:
+                stats = merged.get((method, route))
+                if stats is None:
+                    stats = merged[(method, route)] = RouteStats()
+                stats.merge(values)
+        return merged
+
+    def render_prometheus(self, extra_gauges=None):
+        """
+        生成 Prometheus 文本格式 (text/plain; version=0.0.4)
+        """
+        lines = [
+            "# HELP canteen_request_duration_seconds Request latency per route.",
+            "# TYPE canteen_request_duration_seconds histogram",
+        ]
+        routes = sorted(self.collect().items())
+        for (method, route), s in routes:
+            labels = f'method="{method}",route="{_escape(route)}"'
+            for bound, n in zip(LATENCY_BUCKETS, s.buckets):
+                lines.append(f'canteen_request_duration_seconds_bucket{{{labels},le="{bound}"}} {n}')
+            lines.append(f'canteen_request_duration_seconds_bucket{{{labels},le="+Inf"}} {s.count}')
+            lines.append(f'canteen_request_duration_seconds_sum{{{labels}}} {s.latency_sum:.6f}')
+            lines.append(f'canteen_request_duration_seconds_count{{{labels}}} {s.count}')
+
+        lines.append("# HELP canteen_request_sql_statements_total SQL statements executed, per route.")
+        lines.append("# TYPE canteen_request_sql_statements_total counter")
+        for (method, route), s in routes:
+            lines.append(f'canteen_request_sql_statements_total{{method="{method}",route="{_escape(route)}"}} {s.sql_count}')
+
+        lines.append("# HELP canteen_request_db_seconds_total Time spent in the database, per route.")
+        lines.append("# TYPE canteen_request_db_seconds_total counter")
+        for (method, route), s in routes:
+            lines.append(f'canteen_request_db_seconds_total{{method="{method}",route="{_escape(route)}"}} {s.db_time:.6f}')
+
+        lines.append("# HELP canteen_request_errors_total Responses with status >= 500, per route.")
+        lines.append("# TYPE canteen_request_errors_total counter")
+        for (method, route), s in routes:
+            lines.append(f'canteen_request_errors_total{{method="{method}",route="{_escape(route)}"}} {s.errors}')
+
+        for name, help_text, samples in (extra_gauges or []):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            for labels, value in samples:
+                # gauge 是被抓取的这个 worker 的当前值
+                labels = {**labels, "worker": os.getpid()}
+                label_text = ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items())
+                lines.append(f"{name}{{{label_text}}} {value}")
+
+        lines.append(f'canteen_worker_info{{pid="{os.getpid()}"}} 1')
+        return "\n".join(lines) + "\n"
+
+
+def reset_metrics_dir(directory):
+    """
+    (serve.py / run.py 启动时) 清空上一次运行留下的 worker 文件
+    """
+    if directory:
+        for path in glob.glob(os.path.join(directory, 'worker-*.json*')):
+            os.remove(path)
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+# --- SQLAlchemy 引擎事件: 统计当前请求的 SQL ---
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info['query_start'].pop()
+    # 后台线程 (例如订单组提交) 中执行的 SQL 不属于任何请求
+    if not has_request_context() or 'sql_count' not in g:
+        return
+    g.sql_count += 1
+    g.db_time += elapsed
+    if g.slow_sql is not None:
+        g.slow_sql.append((elapsed, statement))
+
+
+def init_metrics(app):
+    """
+    在 create_app 中调用
+    """
+    metrics = RequestMetrics(app.config.get('METRICS_DIR'), app.config.get('METRICS_FLUSH_INTERVAL', 1.0))
+    app.extensions['request_metrics'] = metrics
+    # 多进程部署 (serve.py) 时每个 worker 写自己的文件
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=metrics._after_fork)
+    slow_log_ms = app.config.get('SLOW_REQUEST_LOG_MS')
+
+    with app.app_context():
+        event.listen(db.engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(db.engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def before_request():
+        g.request_start = time.perf_counter()
+        g.sql_count = 0
+        g.db_time = 0.0
+        # 只有打开慢请求日志时才记录 SQL 原文
+        g.slow_sql = [] if slow_log_ms is not None else None
+
+    @app.after_request
+    def after_request(response):
+        if 'request_start' not in g:
+            return response
+        elapsed = time.perf_counter() - g.request_start
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        metrics.observe(request.method, route, elapsed, g.sql_count, g.db_time, response.status_code)
+
+        if slow_log_ms is not None and elapsed * 1000 >= slow_log_ms:
+            sql_lines = "".join(
+                f"\n    {sql_elapsed * 1000:7.2f}ms  {' '.join(statement.split())}"
+                for sql_elapsed, statement in g.slow_sql
+            )
+            logger.warning("[SlowRequest] %s %s took %.1fms, %d SQL, %.1fms in DB%s",
+                           request.method, request.path, elapsed * 1000, g.sql_count, g.db_time * 1000, sql_lines)
+        return response
+
+    return metrics
@@ -57,6 +57,11 @@ class Order(db.Model):
     OrderTime = db.Column(db.DateTime, default=db.func.current_timestamp())
     # 关系：一个订单包含多个订单详情
     Items = db.relationship('OrderItem', backref='Order', lazy=True, cascade="all, delete-orphan")
+    # 用户历史订单 (GET /api/user/<id>/orders) 按 (UserID, OrderTime, OrderID) 做 keyset 分页
+    # 后面附带列表页要读的其余列, 成为覆盖索引: 读一页订单不需要回表
+    __table_args__ = (
+        db.Index('ix_order_user_history', 'UserID', 'OrderTime', 'OrderID', 'RestaurantID', 'Status', 'TotalPrice'),
+    )
 
 # 5. 交易核心：OrderItem
 class OrderItem(db.Model):
@@ -92,4 +97,17 @@ class MerchantDiscountRule(db.Model):
     # 这是一个复合主键 (RestaurantID, PriceLevel)
     RestaurantID = db.Column(db.Integer, db.ForeignKey('Restaurant.RestaurantID'), primary_key=True)
     PriceLevel = db.Column(db.Integer, primary_key=True) # 商家设置的等级 (1-5)
-    Discount = db.Column(db.Float, nullable=False, default=1.0) # 例如 0.95 (95折)
\ No newline at end of file
+    Discount = db.Column(db.Float, nullable=False, default=1.0) # 例如 0.95 (95折)
+
+# --- 运维记录 ---
+
+# 9. MLPipelineRun: K-Means 管道每次运行的性能记录 (阶段耗时、行数、内存峰值)
+class MLPipelineRun(db.Model):
+    __tablename__ = 'MLPipelineRun'
+    RunID = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    StartedAt = db.Column(db.DateTime, nullable=False)
+    DurationMs = db.Column(db.Float, nullable=False)
+    Success = db.Column(db.Boolean, nullable=False)
+    LevelsWritten = db.Column(db.Integer, nullable=False, default=0)
+    PeakMemoryKB = db.Column(db.Float)
+    Profile = db.Column(db.Text, nullable=False) # 完整的阶段级 profile (JSON)
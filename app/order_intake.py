@@ -0,0 +1,254 @@
+# /app/order_intake.py
+"""
+订单写入 (支持 "组提交" 模式)
+
+默认情况下, 每个 create_order 请求单独 commit 一次, 也就是每单一次 fsync。
+午高峰时 SQLite 的写锁和 fsync 会成为瓶颈。
+
+开启 ORDER_GROUP_COMMIT 后:
+    - 请求线程只负责算价格, 然后把 "订单草稿" 放进队列并等待结果
+    - 每个 worker 进程内有一个后台线程, 把几毫秒内 (或最多 N 单) 到达的订单
+      合并到同一个事务里写入, 只 commit (fsync) 一次
+    - 每单使用一个 SAVEPOINT, 某一单失败只回滚它自己, 不影响同批次的其他订单
+    - 请求线程要等到整批 commit 成功后才返回, 所以持久性和逐单提交时完全一样
+    - 请求线程等待超时: 订单还在队列里时撤回它 (后台线程会跳过, 客户端可以放心重试);
+      已经开始写入时返回 "状态未知", 客户端应先查看订单记录, 否则重试可能重复下单
+
+注意 pysqlite 在 SAVEPOINT 之前不会自动发送 BEGIN, 此时每个 SAVEPOINT 都是最外层事务,
+RELEASE 就等于一次提交。所以每一批都显式 BEGIN, 保证整批只有一次 COMMIT。
+"""
+import logging
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from functools import partial
+
+from flask import current_app
+
+from . import db
+from .models import Order, OrderItem, UserBehaviorLog
+
+logger = logging.getLogger(__name__)
+
+
+class OrderNotWritten(Exception):
+    """
+    等待超时, 订单已从队列中撤回 (确定没有写入)
+    """
+
+
+class OrderStatusUnknown(Exception):
+    """
+    等待超时, 但订单已经开始写入, 不知道最终是否提交成功
+    """
+
+
+def insert_order(draft):
+    """
+    把一个订单草稿加入当前 session (不提交), 返回新的 Order 对象
+
+    draft 格式:
+    {
+        "user_id": 1, "restaurant_id": 1, "total_price": 30.0,
+        "items": [(dish_id, quantity, final_price_per_item), ...]
+    }
+    """
+    new_order = Order(
+        UserID=draft['user_id'],
+        RestaurantID=draft['restaurant_id'],
+        Status='Pending', # (关键) 状态为“待处理”, 供商家确认
+        TotalPrice=draft['total_price'],
+        OrderTime=datetime.now(),
+        Items=[
+            OrderItem(DishID=dish_id, Quantity=quantity, FinalPricePerItem=price)
+            for dish_id, quantity, price in draft['items']
+        ]
+    )
+    db.session.add(new_order)
+
+    # (闭环完成) 将“下单”行为写回日志
+    db.session.add(UserBehaviorLog(
+        UserID=draft['user_id'],
+        RestaurantID=draft['restaurant_id'],
+        ActionType='order_placed',
+        Timestamp=datetime.now()
+    ))
+    return new_order
+
+
+def submit_order(draft):
+    """
+    写入一个订单并返回 OrderID
+    根据配置选择 "逐单提交" 或 "组提交"; 失败时抛出异常
+    """
+    app = current_app._get_current_object()
+    if not app.config.get('ORDER_GROUP_COMMIT'):
+        try:
+            new_order = insert_order(draft)
+            db.session.flush()
+            order_id = new_order.OrderID # commit 之后再读会多一次 SELECT
+            db.session.commit()
+            return order_id
+        except Exception:
+            db.session.rollback()
+            raise
+
+    # 先把请求线程手里的数据库连接还给连接池 (前面的查价只读, 没有未提交的修改)
+    # 否则大量请求同时在这里等待时会占满连接池, 后台提交线程反而拿不到连接
+    db.session.close()
+    return _get_intake(app).submit(draft)
+
+
+class _PendingOrder:
+    def __init__(self, draft):
+        self.draft = draft
+        self.done = threading.Event()
+        self.order_id = None
+        self.error = None
+        # queued -> claimed (后台线程开始写入) 或 queued -> abandoned (请求线程已放弃)
+        self.state = 'queued'
+        self._lock = threading.Lock()
+
+    def transition(self, src, dst):
+        with self._lock:
+            if self.state != src:
+                return False
+            self.state = dst
+            return True
+
+
+class OrderIntake:
+    """
+    每个 worker 进程一个: 一个队列 + 一个后台提交线程
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.max_batch = app.config['ORDER_BATCH_MAX_SIZE']
+        self.window = app.config['ORDER_BATCH_WINDOW_MS'] / 1000.0
+        self.wait_timeout = app.config['ORDER_BATCH_WAIT_TIMEOUT']
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name='order-intake', daemon=True)
+        self.thread.start()
+
+    def submit(self, draft):
+        pending = _PendingOrder(draft)
+        self.queue.put(pending)
+        if not pending.done.wait(self.wait_timeout):
+            if pending.transition('queued', 'abandoned'):
+                raise OrderNotWritten("订单写入超时 (订单未写入), 请稍后重试")
+            if not pending.done.is_set():
+                raise OrderStatusUnknown("订单写入超时, 状态未知, 请先查看订单记录再决定是否重试")
+        if pending.error is not None:
+            raise pending.error
+        return pending.order_id
+
+    def _collect_batch(self):
+        # 阻塞等待第一单, 然后在时间窗口内尽量多收集几单
+        batch = [self.queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                with self.app.app_context():
+                    self._commit_batch(batch)
+            finally:
+                for pending in batch:
+                    pending.done.set()
+
+    def _commit_batch(self, batch):
+        # 已经超时放弃的订单不再写入
+        batch = [pending for pending in batch if pending.transition('queued', 'claimed')]
+        if not batch:
+            return
+
+        written = []
+        try:
+            _begin_batch()
+            for pending in batch:
+                try:
+                    # 每单一个 SAVEPOINT: 失败只回滚这一单
+                    with db.session.begin_nested():
+                        new_order = insert_order(pending.draft)
+                    # 退出 SAVEPOINT 时已经 flush, 主键已生成 (commit 之后再读会触发重新查询)
+                    written.append((pending, new_order.OrderID))
+                except Exception as e:
+                    pending.error = e
+
+            # 整批只提交一次 (一次 fsync)
+            if not _in_transaction():
+                logger.error("[OrderIntake] Batch is no longer inside one transaction; orders were committed individually.")
+            db.session.commit()
+            for pending, order_id in written:
+                pending.order_id = order_id
+            logger.debug("[OrderIntake] Committed batch: %d ok, %d failed.", len(written), len(batch) - len(written))
+        except Exception as e:
+            # 开启事务或 commit 失败: 这一批订单全部无效
+            db.session.rollback()
+            for pending in batch:
+                if pending.error is None:
+                    pending.error = e
+            logger.error("[OrderIntake] Batch commit failed: %s", e)
+        finally:
+            db.session.remove()
+
+
+def _in_transaction():
+    driver_connection = db.session.connection().connection.driver_connection
+    return getattr(driver_connection, 'in_transaction', True)
+
+
+def _begin_batch():
+    """
+    显式开启整批共用的事务 (SQLite)
+    IMMEDIATE: 一开始就拿到写锁, 不会在写到一半时才因为锁冲突失败
+    """
+    connection = db.session.connection()
+    if connection.dialect.name != 'sqlite':
+        return  # 其他数据库的驱动在第一条语句前已经 BEGIN
+    connection.exec_driver_sql("BEGIN IMMEDIATE")
+    if not _in_transaction():
+        raise RuntimeError("无法为订单批次开启事务")
+
+
+_intake_lock = threading.Lock()
+
+
+def _get_intake(app):
+    intake = app.extensions.get('order_intake')
+    if intake is None:
+        with _intake_lock:
+            intake = app.extensions.get('order_intake')
+            if intake is None:
+                intake = OrderIntake(app)
+                app.extensions['order_intake'] = intake
+    return intake
+
+
+def _reset_after_fork(app):
+    # fork 之后后台线程不会被复制到子进程: 丢弃父进程的实例, 子进程第一次下单时重新创建
+    global _intake_lock
+    _intake_lock = threading.Lock()
+    app.extensions.pop('order_intake', None)
+
+
+def init_order_intake(app):
+    """
+    在 create_app 中调用
+    """
+    # 多进程部署 (serve.py) 时每个 worker 使用自己的队列和后台线程
+    if hasattr(os, 'register_at_fork'):
+        os.register_at_fork(after_in_child=partial(_reset_after_fork, app))
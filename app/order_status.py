@@ -0,0 +1,91 @@
+# /app/order_status.py
+"""
+订单状态流转 (商家批量接单 / 出餐)
+
+午高峰商家会连续确认几十个订单。以前每个订单一次 HTTP 请求 = 一次 query.get + 一次 commit,
+现在一批订单在一个事务里用一条 UPDATE 完成:
+
+    UPDATE "Order" SET Status = :target
+    WHERE RestaurantID = :rid AND OrderID IN (...) AND Status IN (允许流转到 target 的状态)
+    RETURNING OrderID
+
+WHERE 中带上 "当前状态" 条件 (compare-and-set), 并发修改过的订单不会被错误地覆盖。
+只有没更新成功的订单才需要再查一次, 用来说明原因 (不存在 / 当前状态不允许)。
+"""
+from sqlalchemy import select, update
+
+from . import db
+from .models import Order
+
+# 当前状态 -> 允许变成的状态
+ALLOWED_TRANSITIONS = {
+    'Pending': {'Confirmed', 'Cancelled'},
+    'Confirmed': {'Completed', 'Cancelled'},
+}
+
+MAX_BATCH_SIZE = 200  # 单次请求最多处理多少个订单
+
+
+def allowed_sources(target):
+    """
+    哪些状态可以流转到 target
+    """
+    return sorted(src for src, targets in ALLOWED_TRANSITIONS.items() if target in targets)
+
+
+def transition_orders(restaurant_id, order_ids, target):
+    """
+    把该餐厅的一批订单改为 target 状态 (一个事务, 一条 UPDATE)
+    返回与 order_ids 顺序一致的结果列表:
+        {"order_id": 1, "ok": True,  "status": "Confirmed"}
+        {"order_id": 2, "ok": False, "error": "not_found"}
+        {"order_id": 3, "ok": False, "error": "invalid_transition", "status": "Completed"}
+    target 不是合法的目标状态时抛出 ValueError
+    """
+    sources = allowed_sources(target)
+    if not sources:
+        raise ValueError(f"不支持的目标状态: {target}")
+
+    try:
+        # --- 1. 一条 UPDATE 完成所有合法的流转 ---
+        where = (
+            Order.RestaurantID == restaurant_id,
+            Order.OrderID.in_(order_ids),
+            Order.Status.in_(sources),
+        )
+        if db.engine.dialect.update_returning:
+            updated = set(db.session.execute(
+                update(Order).where(*where).values(Status=target).returning(Order.OrderID)
+            ).scalars())
+        else:
+            # 不支持 RETURNING 的数据库: 先在同一事务内查出符合条件的订单
+            updated = set(db.session.execute(select(Order.OrderID).where(*where)).scalars())
+            if updated:
+                db.session.execute(
+                    update(Order).where(Order.OrderID.in_(list(updated)), *where[2:]).values(Status=target)
+                )
+
+        # --- 2. 只为失败的订单查询原因 ---
+        failed = [oid for oid in order_ids if oid not in updated]
+        current = {}
+        if failed:
+            current = dict(db.session.execute(
+                select(Order.OrderID, Order.Status)
+                .where(Order.RestaurantID == restaurant_id, Order.OrderID.in_(failed))
+            ).all())
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    # --- 3. 逐个订单的结果 ---
+    results = []
+    for oid in order_ids:
+        if oid in updated:
+            results.append({"order_id": oid, "ok": True, "status": target})
+        elif oid not in current:
+            results.append({"order_id": oid, "ok": False, "error": "not_found"})
+        else:
+            results.append({"order_id": oid, "ok": False, "error": "invalid_transition", "status": current[oid]})
+    return results
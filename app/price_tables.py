@@ -0,0 +1,166 @@
+# /app/price_tables.py
+"""
+预编译的 "餐厅价格表" (菜单列表 和 下单算价 共用)
+
+以前 get_dishes_for_restaurant 和 create_order 每次请求都要查询 Dish,
+再逐个菜品计算 BasePrice * discount。现在每个餐厅在内存中保存一张表:
+    dish_ids     int64[n]    (升序)
+    base_prices  float64[n]
+    names / image_urls       (菜单展示用)
+    discounts    float64[max_level + 1]   PriceLevel -> Discount (MerchantDiscountRule)
+菜单价格和订单明细价格都用 numpy 向量运算一次算完, 请求中不再查询 Dish。
+
+菜单响应还会被预先编码成 JSON bytes: 每个菜品不变的部分 (id/name/image_url/base_price)
+只编码一次, 个性化的 final_price / discount_label 按折扣拼接上去, 并按折扣缓存整份菜单。
+一个餐厅通常只有几个折扣等级, 所以之后的菜单请求只是一次字典查找。
+
+当菜品或折扣规则变化时 (见 app/pricing.py 的 price_generation), 表会在下次使用时重建。
+"""
+import threading
+
+import numpy as np
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import db
+from .json_provider import dumps_bytes
+from .models import Dish, MerchantDiscountRule
+from .row_mapping import DISH_ROWS, RULE_ROWS
+from .pricing import DEFAULT_DISCOUNT, price_generation, publish_price_table
+
+_tables = {}  # RestaurantID -> (generation, RestaurantPriceTable)
+_build_lock = threading.Lock()
+
+
+class RestaurantPriceTable:
+    def __init__(self, restaurant_id, dishes, rules):
+        """
+        dishes: [(DishID, Name, BasePrice, image_url), ...]
+        rules:  [(PriceLevel, Discount), ...]
+        """
+        self.restaurant_id = restaurant_id
+
+        dishes = sorted(dishes, key=lambda d: d[0])
+        self.dish_ids = np.array([d[0] for d in dishes], dtype=np.int64)
+        self.base_prices = np.array([d[2] for d in dishes], dtype=np.float64)
+        self.names = [d[1] for d in dishes]
+        self.image_urls = [d[3] for d in dishes]
+
+        self._fragments = None  # 每个菜品的静态 JSON 片段 (去掉结尾的 '}')
+        self._menu_json = {}    # discount -> 完整的菜单 JSON bytes
+
+        max_level = max([level for level, _ in rules if level >= 0], default=0)
+        self.discounts = np.full(max_level + 1, DEFAULT_DISCOUNT, dtype=np.float64)
+        for level, discount in rules:
+            if level >= 0:
+                self.discounts[level] = discount
+
+    def discount(self, price_level):
+        if 0 <= price_level < len(self.discounts):
+            return float(self.discounts[price_level])
+        return DEFAULT_DISCOUNT
+
+    def menu_prices(self, discount):
+        """
+        整个菜单的最终价格 (与 dish_ids 一一对应)
+        """
+        return self.base_prices * discount
+
+    def menu_json(self, discount, discount_label):
+        """
+        整份菜单的 JSON bytes (get_dishes_for_restaurant 的响应体), 按折扣缓存
+        """
+        body = self._menu_json.get(discount)
+        if body is not None:
+            return body
+
+        if self._fragments is None:
+            self._fragments = [
+                dumps_bytes({
+                    "id": dish_id,
+                    "name": name,
+                    "image_url": image_url,   # (新) 返回图片 URL
+                    "base_price": base_price  # (新) 返回原价
+                })[:-1]
+                for dish_id, name, image_url, base_price in zip(
+                    self.dish_ids.tolist(), self.names, self.image_urls, self.base_prices.tolist())
+            ]
+
+        # 只有这两个字段是 "个性化" 的
+        label = dumps_bytes(discount_label)  # (新) 返回 "98%" 标签
+        final_prices = self.menu_prices(discount).tolist()  # (新) 返回最终价
+        parts = [
+            b'%s,"discount_label":%s,"final_price":%s}' % (fragment, label, dumps_bytes(final_price))
+            for fragment, final_price in zip(self._fragments, final_prices)
+        ]
+        body = b'[' + b','.join(parts) + b']'
+        self._menu_json[discount] = body
+        return body
+
+    def line_prices(self, dish_ids, discount):
+        """
+        订单明细的最终单价 (与传入的 dish_ids 一一对应)
+        菜品不属于该餐厅时抛出 ValueError
+        """
+        wanted = np.asarray(dish_ids, dtype=np.int64)
+        if len(self.dish_ids) == 0:
+            raise ValueError(f"菜品 ID {int(wanted[0])} 未找到")
+
+        idx = np.minimum(np.searchsorted(self.dish_ids, wanted), len(self.dish_ids) - 1)
+        found = self.dish_ids[idx] == wanted
+        if not found.all():
+            raise ValueError(f"菜品 ID {int(wanted[~found][0])} 未找到")
+        return self.base_prices[idx] * discount
+
+
+def _build_table(restaurant_id):
+    with db.engine.connect() as conn:
+        dishes = conn.execute(
+            DISH_ROWS.select().where(Dish.RestaurantID == restaurant_id)
+        ).all()
+        rules = conn.execute(
+            RULE_ROWS.select().where(MerchantDiscountRule.RestaurantID == restaurant_id)
+        ).all()
+    return RestaurantPriceTable(restaurant_id, dishes, rules)
+
+
+def get_restaurant_table(restaurant_id):
+    """
+    返回该餐厅当前版本的价格表 (必要时重建)
+    """
+    restaurant_id = int(restaurant_id)
+    generation = price_generation()
+    cached = _tables.get(restaurant_id)
+    if cached is not None and cached[0] == generation:
+        return cached[1]
+
+    with _build_lock:
+        cached = _tables.get(restaurant_id)
+        if cached is not None and cached[0] == generation:
+            return cached[1]
+        table = _build_table(restaurant_id)
+        _tables[restaurant_id] = (generation, table)
+        return table
+
+
+# --- 菜品变化时自动刷新 ---
+# 任何 session 提交了 Dish 的增删改, 都重新发布共享价格快照,
+# 所有 worker 进程中的餐厅价格表因此失效 (版本号变化)
+
+@event.listens_for(Session, 'after_flush')
+def _mark_dish_changes(session, flush_context):
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        if isinstance(obj, Dish):
+            session.info['dishes_changed'] = True
+            return
+
+
+@event.listens_for(Session, 'after_commit')
+def _publish_on_dish_commit(session):
+    if session.info.pop('dishes_changed', False):
+        publish_price_table()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_dish_changes(session):
+    session.info.pop('dishes_changed', None)
@@ -0,0 +1,159 @@
+# /app/pricing.py
+"""
+"个性化定价" 查表 (跨进程共享)
+
+get_dishes_for_restaurant 和 create_order 每次请求都要查两张表:
+    UserPriceLevel       (UserID, RestaurantID) -> PriceLevel   (ML 的输出)
+    MerchantDiscountRule (RestaurantID, PriceLevel) -> Discount (商家规则)
+
+UserPriceLevel 只在 run_ml_pipeline 时才会变化, 而且行数是 用户数 x 餐厅数,
+所以我们把它整体编码成一个紧凑的二进制数组快照, 放在 instance/ 下通过 mmap 共享给所有 worker 进程。
+请求线程只做二分查找, 不访问数据库。
+折扣规则每个餐厅只有几行, 由 app/price_tables.py 的餐厅价格表直接从数据库加载,
+不放进快照; set_rules 之后仍然要重新发布快照, 让各进程的版本号 (price_generation) 变化。
+
+快照格式 (小端):
+    header:  magic(4s) | n_levels(I) | reserved(I)
+    int64[n_levels]   level_keys     (RestaurantID << 32 | UserID), 升序
+    int32[n_levels]   level_values
+"""
+import logging
+import struct
+from array import array
+from bisect import bisect_left
+
+from flask import current_app
+from sqlalchemy import select
+
+from . import db
+from .models import UserPriceLevel
+from .shared_snapshot import SharedSnapshot
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'CPT2'
+HEADER = struct.Struct('<4sII')
+
+DEFAULT_PRICE_LEVEL = 1  # 新用户或低价值用户
+DEFAULT_DISCOUNT = 1.0   # 没有规则时按原价
+
+_snapshots = {}  # path -> SharedSnapshot
+_decoded = {}    # path -> (stamp, PriceTable)
+_local_generation = 0  # 本进程发布的次数 (共享快照关闭时也能让本进程的缓存失效)
+
+
+def _make_key(high, low):
+    return (int(high) << 32) | (int(low) & 0xFFFFFFFF)
+
+
+class PriceTable:
+    """
+    一个已解码的快照版本 (只读, 直接引用 mmap 中的内存, 不做拷贝)
+    """
+
+    def __init__(self, buffer):
+        magic, n_levels, _ = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("价格表快照格式错误")
+
+        view = memoryview(buffer)
+        offset = HEADER.size
+        self.level_keys = view[offset:offset + 8 * n_levels].cast('q')
+        offset += 8 * n_levels
+        self.level_values = view[offset:offset + 4 * n_levels].cast('i')
+
+    def price_level(self, user_id, restaurant_id):
+        key = _make_key(restaurant_id, user_id)
+        i = bisect_left(self.level_keys, key)
+        if i < len(self.level_keys) and self.level_keys[i] == key:
+            return self.level_values[i]
+        return DEFAULT_PRICE_LEVEL
+
+
+def _snapshot():
+    path = current_app.config['PRICE_TABLE_PATH']
+    snapshot = _snapshots.get(path)
+    if snapshot is None:
+        snapshot = _snapshots.setdefault(path, SharedSnapshot(path))
+    return snapshot
+
+
+def encode_price_table(levels):
+    """
+    levels: [(UserID, RestaurantID, PriceLevel), ...]
+    """
+    levels = sorted((_make_key(r, u), lvl) for u, r, lvl in levels)
+
+    payload = bytearray(HEADER.pack(MAGIC, len(levels), 0))
+    payload += array('q', [k for k, _ in levels]).tobytes()
+    payload += array('i', [v for _, v in levels]).tobytes()
+    return bytes(payload)
+
+
+def publish_price_table():
+    """
+    从数据库重新读取价格等级, 原子地替换共享快照
+    (必须在事务 commit 之后、应用上下文中调用)
+    使用独立的数据库连接读取, 不影响调用方的 session
+    """
+    global _local_generation
+    _local_generation += 1
+    if not current_app.config.get('PRICE_TABLE_ENABLED'):
+        return
+
+    snapshot = _snapshot()
+    # 发布者之间加锁: 保证最后一个发布的版本读到的是最新提交的数据
+    with snapshot.publish_lock(), db.engine.connect() as conn:
+        levels = conn.execute(select(
+            UserPriceLevel.UserID, UserPriceLevel.RestaurantID, UserPriceLevel.PriceLevel
+        )).all()
+        snapshot.publish(encode_price_table(levels))
+    logger.info("[Pricing] Published price table: %d levels.", len(levels))
+
+
+def price_generation():
+    """
+    价格数据的版本号: 任何进程发布新快照 (或本进程发布) 后都会变化
+    上层的缓存 (见 app/price_tables.py) 用它判断是否需要重建
+    """
+    stamp = None
+    if current_app.config.get('PRICE_TABLE_ENABLED'):
+        stamp, _ = _snapshot().read()
+    return stamp, _local_generation
+
+
+def get_price_table():
+    """
+    返回当前版本的 PriceTable; 未启用或快照不存在时返回 None
+    """
+    if not current_app.config.get('PRICE_TABLE_ENABLED'):
+        return None
+
+    snapshot = _snapshot()
+    stamp, buffer = snapshot.read()
+    if buffer is None:
+        return None
+
+    cached = _decoded.get(snapshot.path)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    table = PriceTable(buffer)
+    _decoded[snapshot.path] = (stamp, table)
+    return table
+
+
+def resolve_price_level(user_id, restaurant_id):
+    """
+    只查用户在该餐厅的价格等级 (折扣由 app/price_tables.py 中的餐厅价格表给出)
+    """
+    table = get_price_table()
+    if table is not None:
+        return table.price_level(user_id, restaurant_id)
+
+    user_level_entry = db.session.get(UserPriceLevel, {
+        'UserID': user_id,
+        'RestaurantID': restaurant_id
+    })
+    return user_level_entry.PriceLevel if user_level_entry else DEFAULT_PRICE_LEVEL
+
@@ -0,0 +1,135 @@
+# /app/row_mapping.py
+"""
+只读列表接口的 "行 -> JSON" 映射层
+
+列表接口只需要几列数据, 用 ORM 查询会为每一行创建完整的模型实例
+(identity map、属性监听、懒加载关系 ...), 然后再把几列拷贝进 dict。
+这里改为:
+    1. 用 Core select() 只查需要的列, 返回轻量的 Row 元组
+    2. RowMapper 按固定的位置把元组转成 JSON dict (可以对单个字段做转换)
+每个 RowMapper 同时定义 "查哪些列" 和 "输出成什么 key", 两者不会不一致。
+"""
+from sqlalchemy import select
+
+from .models import Restaurant, MerchantDiscountRule, Order, OrderItem, User, Dish
+
+
+class RowMapper:
+    """
+    用法:
+        RESTAURANT_ROWS = RowMapper(id=Restaurant.RestaurantID, name=Restaurant.Name)
+        rows = db.session.execute(RESTAURANT_ROWS.select()).all()
+        output = RESTAURANT_ROWS.to_dicts(rows)
+
+    字段可以写成 (列, 转换函数), 例如 order_time=(Order.OrderTime, _isoformat)
+    """
+
+    def __init__(self, **fields):
+        self.keys = tuple(fields)
+        self.columns = []
+        self.converters = []
+        for i, spec in enumerate(fields.values()):
+            column, convert = spec if isinstance(spec, tuple) else (spec, None)
+            self.columns.append(column)
+            if convert is not None:
+                self.converters.append((i, convert))
+
+    def select(self, *extra_columns):
+        """
+        额外的列 (extra_columns) 排在映射字段之后, 不会出现在 JSON 中
+        """
+        return select(*self.columns, *extra_columns)
+
+    def to_dict(self, row):
+        if not self.converters:
+            return dict(zip(self.keys, row))
+        values = list(row[:len(self.keys)])
+        for i, convert in self.converters:
+            values[i] = convert(values[i])
+        return dict(zip(self.keys, values))
+
+    def to_dicts(self, rows):
+        to_dict = self.to_dict
+        return [to_dict(row) for row in rows]
+
+
+def _isoformat(value):
+    return value.isoformat() if value is not None else None
+
+
+def _default(text):
+    return lambda value: value if value is not None else text
+
+
+# --- 各接口的映射定义 ---
+
+# GET /api/restaurants
+RESTAURANT_ROWS = RowMapper(
+    id=Restaurant.RestaurantID,
+    name=Restaurant.Name,
+    location=Restaurant.Location
+)
+
+# GET /api/restaurant/<id>/rules
+RULE_ROWS = RowMapper(
+    PriceLevel=MerchantDiscountRule.PriceLevel,
+    Discount=MerchantDiscountRule.Discount
+)
+
+# GET /api/restaurant/<id>/dishes (餐厅价格表的数据来源, 见 app/price_tables.py)
+DISH_ROWS = RowMapper(
+    id=Dish.DishID,
+    name=Dish.Name,
+    base_price=Dish.BasePrice,
+    image_url=Dish.image_url
+)
+
+# GET /api/restaurant/<id>/orders (订单主体, 需要 outer join User)
+ORDER_FEED_ROWS = RowMapper(
+    order_id=Order.OrderID,
+    user_name=(User.Username, _default("未知用户")),
+    status=Order.Status,
+    total_price=Order.TotalPrice,
+    order_time=(Order.OrderTime, _isoformat)
+)
+
+# GET /api/user/<id>/orders (用户历史订单, 需要 outer join Restaurant)
+USER_ORDER_ROWS = RowMapper(
+    order_id=Order.OrderID,
+    restaurant_id=Order.RestaurantID,
+    restaurant_name=(Restaurant.Name, _default("未知餐厅")),
+    status=Order.Status,
+    total_price=Order.TotalPrice,
+    order_time=(Order.OrderTime, _isoformat)
+)
+
+# 订单明细 (需要 outer join Dish; 额外带上 OrderItem.OrderID 用来分组)
+ORDER_ITEM_ROWS = RowMapper(
+    dish_name=(Dish.Name, _default("未知菜品")),
+    quantity=OrderItem.Quantity,
+    final_price_per_item=OrderItem.FinalPricePerItem
+)
+
+
+def attach_order_items(session, orders):
+    """
+    为一批订单 dict 填充 "items" (一次查询, 不再逐单懒加载)
+    orders: ORDER_FEED_ROWS.to_dicts(...) 的结果
+    """
+    by_id = {}
+    for order in orders:
+        order["items"] = []
+        by_id[order["order_id"]] = order
+    if not by_id:
+        return orders
+
+    stmt = (
+        ORDER_ITEM_ROWS.select(OrderItem.OrderID)
+        .select_from(OrderItem)
+        .outerjoin(Dish, Dish.DishID == OrderItem.DishID)
+        .where(OrderItem.OrderID.in_(list(by_id)))
+        .order_by(OrderItem.OrderItemID)
+    )
+    for row in session.execute(stmt):
+        by_id[row[-1]]["items"].append(ORDER_ITEM_ROWS.to_dict(row))
+    return orders
@@ -0,0 +1,213 @@
+# /app/search.py
+"""
+菜品 / 餐厅全文搜索 (SQLite FTS5)
+
+学生可以直接搜索 "拉面", 不用先选餐厅再翻整张菜单。
+用 LIKE '%拉面%' 会全表扫描, 这里维护一张 FTS5 倒排索引 SearchIndex:
+    rowid = DishID * 2 (菜品) 或 RestaurantID * 2 + 1 (餐厅)
+    kind, ref_id, restaurant_id  (不分词, 只用于取回结果)
+    title   菜品名 / 餐厅名
+    detail  餐厅位置 (菜品为空)
+
+中文分词: FTS5 的 unicode61 分词器会把一串连续的汉字当成一个词, 搜不到 "兰州拉面" 中的 "拉面";
+trigram 分词器又要求查询至少 3 个字。所以我们在写入和查询时都把每个汉字 (CJK 字符)
+用空格隔开, 查询 "拉面" 变成短语 "拉 面" —— 任意长度的查询都能走索引。
+
+索引通过 ORM 的 after_insert/after_update/after_delete 事件与 Dish、Restaurant 保持同步
+(在同一个事务内写入)。绕过 ORM 的批量写入需要调用 index_restaurants / rebuild_search_index。
+"""
+import logging
+import re
+
+from flask import current_app, has_app_context
+from sqlalchemy import event, text
+
+from . import db
+from .models import Dish, Restaurant
+
+logger = logging.getLogger(__name__)
+
+# 中日韩文字: 每个字单独成词
+_CJK = re.compile(r'([぀-ヿ㐀-䶿一-鿿가-힯豈-﫿])')
+
+_CREATE_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS SearchIndex USING fts5(
+    kind UNINDEXED, ref_id UNINDEXED, restaurant_id UNINDEXED,
+    title, detail,
+    tokenize = 'unicode61 remove_diacritics 2'
+)
+"""
+
+# bm25 权重: 名称命中比位置命中重要得多
+# 绕过 ORM 的删除 (query(...).delete()) 不会触发映射器事件, 索引里可能残留已删除的菜品 / 餐厅,
+# 所以只返回还能 JOIN 到原始行的结果
+_SEARCH_SQL = """
+SELECT s.kind, s.ref_id, s.restaurant_id, bm25(SearchIndex, 0, 0, 0, 10.0, 2.0) AS rank,
+       d.Name, d.BasePrice, d.image_url, r.Name, r.Location, r.image_url
+FROM SearchIndex AS s
+LEFT JOIN Dish AS d ON s.kind = 'dish' AND d.DishID = s.ref_id
+LEFT JOIN Restaurant AS r ON r.RestaurantID = s.restaurant_id
+WHERE SearchIndex MATCH :query
+  AND (s.kind = 'restaurant' OR d.DishID IS NOT NULL)
+  AND r.RestaurantID IS NOT NULL
+ORDER BY rank
+LIMIT :limit OFFSET :offset
+"""
+
+
+def segment(value):
+    """
+    写入索引前的分词: 每个汉字前后加空格
+    """
+    return _CJK.sub(r' \1 ', value or '')
+
+
+def build_match_query(query):
+    """
+    把用户输入转成 FTS5 查询: 每个空格分隔的词是一个短语 (多个词之间是 AND),
+    最后一个词做前缀匹配 (边输入边搜索)
+    """
+    phrases = []
+    for term in query.split():
+        tokens = segment(term).split()
+        if tokens:
+            phrases.append('"' + ' '.join(tokens).replace('"', '""') + '"')
+    if not phrases:
+        return None
+    phrases[-1] += '*'
+    return ' '.join(phrases)
+
+
+def fts_enabled():
+    return has_app_context() and current_app.extensions.get('search_fts', False)
+
+
+# --- 索引维护 ---
+
+def _dish_row(dish_id, restaurant_id, name):
+    return {"rowid": dish_id * 2, "kind": "dish", "ref_id": dish_id,
+            "restaurant_id": restaurant_id, "title": segment(name), "detail": ""}
+
+
+def _restaurant_row(restaurant_id, name, location):
+    return {"rowid": restaurant_id * 2 + 1, "kind": "restaurant", "ref_id": restaurant_id,
+            "restaurant_id": restaurant_id, "title": segment(name), "detail": segment(location)}
+
+
+_INSERT_SQL = text(
+    "INSERT INTO SearchIndex(rowid, kind, ref_id, restaurant_id, title, detail) "
+    "VALUES (:rowid, :kind, :ref_id, :restaurant_id, :title, :detail)"
+)
+_DELETE_SQL = text("DELETE FROM SearchIndex WHERE rowid = :rowid")
+
+
+def _replace(connection, rows):
+    if rows:
+        connection.execute(_DELETE_SQL, [{"rowid": r["rowid"]} for r in rows])
+        connection.execute(_INSERT_SQL, rows)
+
+
+def index_restaurants(connection, restaurants):
+    """
+    批量写入/更新餐厅的索引 (给绕过 ORM 的批量导入使用)
+    restaurants: [(RestaurantID, Name, Location), ...]
+    """
+    if fts_enabled():
+        _replace(connection, [_restaurant_row(*r) for r in restaurants])
+
+
+def rebuild_search_index(connection):
+    """
+    清空并根据 Dish、Restaurant 重建整个索引
+    """
+    connection.execute(text("DELETE FROM SearchIndex"))
+    dishes = connection.execute(text("SELECT DishID, RestaurantID, Name FROM Dish")).all()
+    restaurants = connection.execute(text("SELECT RestaurantID, Name, Location FROM Restaurant")).all()
+    rows = [_dish_row(*d) for d in dishes] + [_restaurant_row(*r) for r in restaurants]
+    if rows:
+        connection.execute(_INSERT_SQL, rows)
+    return len(rows)
+
+
+def init_search(app):
+    """
+    在 create_app 中调用: 创建 FTS5 表, 索引为空或不完整时重建
+    """
+    app.extensions['search_fts'] = False
+    if db.engine.dialect.name != 'sqlite':
+        logger.warning("Full-text search requires SQLite FTS5; falling back to LIKE.")
+        return
+    try:
+        with db.engine.begin() as conn:
+            conn.execute(text(_CREATE_SQL))
+            indexed = conn.execute(text("SELECT count(*) FROM SearchIndex")).scalar()
+            expected = conn.execute(text(
+                "SELECT (SELECT count(*) FROM Dish) + (SELECT count(*) FROM Restaurant)"
+            )).scalar()
+            if indexed != expected:
+                count = rebuild_search_index(conn)
+                logger.info("[Search] Rebuilt search index: %d entries.", count)
+    except Exception as e:
+        logger.warning("FTS5 is not available (%s); falling back to LIKE.", e)
+        return
+    app.extensions['search_fts'] = True
+
+
+@event.listens_for(Dish, 'after_insert')
+@event.listens_for(Dish, 'after_update')
+def _index_dish(mapper, connection, target):
+    if fts_enabled():
+        _replace(connection, [_dish_row(target.DishID, target.RestaurantID, target.Name)])
+
+
+@event.listens_for(Restaurant, 'after_insert')
+@event.listens_for(Restaurant, 'after_update')
+def _index_restaurant(mapper, connection, target):
+    if fts_enabled():
+        _replace(connection, [_restaurant_row(target.RestaurantID, target.Name, target.Location)])
+
+
+@event.listens_for(Dish, 'after_delete')
+def _unindex_dish(mapper, connection, target):
+    if fts_enabled():
+        connection.execute(_DELETE_SQL, {"rowid": target.DishID * 2})
+
+
+@event.listens_for(Restaurant, 'after_delete')
+def _unindex_restaurant(mapper, connection, target):
+    if fts_enabled():
+        connection.execute(_DELETE_SQL, {"rowid": target.RestaurantID * 2 + 1})
+
+
+# --- 查询 ---
+
+def search(query, limit, offset):
+    """
+    返回按相关度排序的结果行:
+    (kind, ref_id, restaurant_id, rank, dish_name, base_price, dish_image,
+     restaurant_name, location, restaurant_image)
+    """
+    if fts_enabled():
+        match = build_match_query(query)
+        if match is None:
+            return []
+        return db.session.execute(text(_SEARCH_SQL), {
+            "query": match, "limit": limit, "offset": offset
+        }).all()
+    return _search_like(query, limit, offset)
+
+
+def _search_like(query, limit, offset):
+    """
+    没有 FTS5 时的退路 (全表扫描, 只适合小数据量)
+    """
+    pattern = f"%{query.strip()}%"
+    dishes = db.session.query(
+        db.literal('dish'), Dish.DishID, Dish.RestaurantID, db.literal(0.0),
+        Dish.Name, Dish.BasePrice, Dish.image_url, Restaurant.Name, Restaurant.Location, Restaurant.image_url
+    ).join(Restaurant, Restaurant.RestaurantID == Dish.RestaurantID).filter(Dish.Name.like(pattern))
+    restaurants = db.session.query(
+        db.literal('restaurant'), Restaurant.RestaurantID, Restaurant.RestaurantID, db.literal(0.0),
+        db.literal(None), db.literal(None), db.literal(None), Restaurant.Name, Restaurant.Location, Restaurant.image_url
+    ).filter(db.or_(Restaurant.Name.like(pattern), Restaurant.Location.like(pattern)))
+    return dishes.union_all(restaurants).limit(limit).offset(offset).all()
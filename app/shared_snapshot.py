@@ -0,0 +1,95 @@
+# /app/shared_snapshot.py
+"""
+跨进程共享的只读快照 (mmap)
+
+多个 worker 进程 (见 serve.py) 各自在内存里缓存一份数据, 会互相不一致。
+这里的做法是:
+    - 写入方 (发布者) 把完整的新快照写到临时文件, 然后用 os.replace 原子地替换旧文件
+    - 读取方 把文件 mmap 到内存中直接读; 每次读取前只做一次 os.stat,
+      发现文件被替换 (inode 变化) 才重新映射
+读取方不需要任何锁: 旧文件即使被替换, 已经映射的内存仍然有效,
+所以同一时刻每个进程看到的一定是某一个完整的版本。
+"""
+import mmap
+import os
+import threading
+
+try:
+    import fcntl  # 仅 POSIX: 用来串行化多个发布者
+except ImportError:  # pragma: no cover (Windows)
+    fcntl = None
+
+
+class SharedSnapshot:
+    def __init__(self, path):
+        self.path = path
+        # (stamp, buffer): stamp = (st_ino, st_mtime_ns, st_size), buffer = 当前映射的 mmap
+        # 作为一个整体赋值, 多线程下不会读到 "新 stamp + 旧 buffer"
+        self._current = (None, None)
+
+    # --- 发布 (写入方) ---
+    def publish_lock(self):
+        """
+        发布者之间的互斥锁 (文件锁, 对所有进程有效)
+        用法: with snapshot.publish_lock(): 读数据库 -> publish()
+        """
+        return _FileLock(self.path + '.lock')
+
+    def publish(self, payload):
+        """
+        原子地发布一个新版本
+        """
+        tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(payload)
+        os.replace(tmp_path, self.path)
+
+    # --- 读取 (无锁) ---
+    def read(self):
+        """
+        返回 (stamp, buffer)。快照文件不存在时返回 (None, None)
+        stamp 可以作为版本号, 用来判断上层缓存是否需要重建
+        """
+        try:
+            st = os.stat(self.path)
+        except FileNotFoundError:
+            return None, None
+
+        stamp = (st.st_ino, st.st_mtime_ns, st.st_size)
+        current = self._current
+        if stamp != current[0]:
+            current = self._remap(stamp) or current
+        return current
+
+    def _remap(self, stamp):
+        try:
+            with open(self.path, 'rb') as f:
+                if stamp[2] == 0:
+                    buffer = b''
+                else:
+                    buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                st = os.fstat(f.fileno())
+        except FileNotFoundError:
+            return None
+        # 以实际打开的文件为准 (stat 和 open 之间文件可能又被替换了一次)
+        # 注意: 旧的 mmap 不主动 close, 其他线程可能还在读, 交给 GC 回收
+        self._current = ((st.st_ino, st.st_mtime_ns, st.st_size), buffer)
+        return self._current
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+        self._f = None
+
+    def __enter__(self):
+        self._f = open(self.path, 'a')
+        if fcntl is not None:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if fcntl is not None:
+            fcntl.flock(self._f.fileno(), fcntl.LOCK_UN)
+        self._f.close()
+        self._f = None
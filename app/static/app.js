@@ -33,6 +33,8 @@ document.addEventListener('DOMContentLoaded', () => {
             if (response.ok) {
                 localStorage.setItem('user_id', data.user_id);
                 localStorage.setItem('username', data.username);
+                localStorage.setItem('area', data.area || ''); // 餐厅列表按区域排序
+                localStorage.setItem('session_token', data.token); // 会话令牌 (Authorization: Bearer)
                 window.location.href = '/dashboard'; 
             } else {
                 alert(`登录失败: ${data.error}`);
@@ -57,6 +59,7 @@ document.addEventListener('DOMContentLoaded', () => {
             if (response.ok) {
                 localStorage.setItem('restaurant_id', data.restaurant_id);
                 localStorage.setItem('restaurant_name', data.name);
+                localStorage.setItem('session_token', data.token); // 会话令牌 (Authorization: Bearer)
                 window.location.href = '/merchant_dashboard'; 
             } else {
                 alert(`登录失败: ${data.error}`);
@@ -18,10 +18,29 @@ const logoutBtn = document.getElementById('logout-btn');
 const usernameDisplayEl = document.getElementById('username-display');
 const finalPriceMsgEl = document.getElementById('final-price-msg'); 
 const kmeansBtn = document.getElementById('run-kmeans-btn'); // <-- 【新增此行】
+const loadMoreRestaurantsBtn = document.getElementById('load-more-restaurants-btn');
+let restaurantsCursor = null; // 餐厅列表的下一页游标
+const orderHistoryListEl = document.getElementById('order-history-list');
+const loadMoreHistoryBtn = document.getElementById('load-more-history-btn');
+let historyCursor = null; // 历史订单的下一页游标
+
+// 需要身份的接口: 带上登录时保存的会话令牌; 令牌过期时回到登录页
+async function authFetch(url, options = {}) {
+    const response = await fetch(url, {
+        ...options,
+        headers: { ...(options.headers || {}), 'Authorization': `Bearer ${localStorage.getItem('session_token')}` }
+    });
+    if (response.status === 401) {
+        alert('登录已过期, 请重新登录');
+        localStorage.clear();
+        window.location.href = '/';
+    }
+    return response;
+}
 
 // --- 1. 页面加载时执行 ---
 document.addEventListener('DOMContentLoaded', () => {
-    if (!currentUserId) {
+    if (!currentUserId || !localStorage.getItem('session_token')) {
         alert('请先登录！');
         window.location.href = '/'; 
         return;
@@ -36,19 +55,28 @@ document.addEventListener('DOMContentLoaded', () => {
 
     placeOrderBtn.addEventListener('click', handlePlaceOrder);
     kmeansBtn.addEventListener('click', handleRunKmeans);
+    loadMoreRestaurantsBtn.addEventListener('click', () => loadRestaurants(restaurantsCursor));
+    loadMoreHistoryBtn.addEventListener('click', () => loadOrderHistory(historyCursor));
+    loadOrderHistory();
 
 });
 
-// --- 2. 【修改】加载所有餐厅 (以显示图片) ---
-async function loadRestaurants() {
+// --- 2. 【修改】加载餐厅 (分页, 用户所在区域的餐厅排在前面) ---
+async function loadRestaurants(cursor = null) {
     try {
-        const response = await fetch('/api/restaurants');
+        const params = new URLSearchParams();
+        const area = localStorage.getItem('area');
+        if (area) params.set('area', area);
+        if (cursor) params.set('cursor', cursor);
+        const response = await fetch(`/api/restaurants?${params}`);
         if (!response.ok) throw new Error('无法获取餐厅列表');
         
-        const restaurants = await response.json();
-        restaurantListEl.innerHTML = ''; 
+        const data = await response.json();
+        if (!cursor) restaurantListEl.innerHTML = ''; 
+        restaurantsCursor = data.next_cursor;
+        loadMoreRestaurantsBtn.style.display = restaurantsCursor ? 'block' : 'none';
         
-        restaurants.forEach(r => {
+        data.restaurants.forEach(r => {
             const card = document.createElement('div');
             card.className = 'card restaurant-card';
             
@@ -57,7 +85,7 @@ async function loadRestaurants() {
                 <img src="${r.image_url || 'https://placehold.co/400x200/eee/ccc?text=暂无图片'}" alt="${r.name}" class="restaurant-image">
                 <div class="restaurant-info">
                     <h3>${r.name}</h3>
-                    <p>${r.location || '暂无描述'}</p>
+                    <p>${r.location || '暂无描述'}${r.nearby ? ' · 离你最近' : ''}</p>
                 </div>
             `;
             card.addEventListener('click', () => showDishesModal(r.id, r.name));
@@ -89,8 +117,8 @@ async function showDishesModal(restaurantId, restaurantName) {
     logBehavior('view_restaurant', restaurantId);
 
     try {
-        // 【修改】调用“智能 API”，必须附带 user_id
-        const response = await fetch(`/api/restaurant/${restaurantId}/dishes?user_id=${currentUserId}`);
+        // 【修改】调用“智能 API”，个性化价格按会话令牌中的用户计算
+        const response = await authFetch(`/api/restaurant/${restaurantId}/dishes`);
         
         if (!response.ok) throw new Error('无法获取菜品');
         
@@ -204,7 +232,7 @@ async function handlePlaceOrder() {
     };
 
     try {
-        const response = await fetch('/api/order/create', {
+        const response = await authFetch('/api/order/create', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(orderData)
@@ -223,6 +251,7 @@ async function handlePlaceOrder() {
             
             currentCart = [];
             updateCart();
+            loadOrderHistory(); // 新订单出现在历史订单最上面
         } else {
             finalPriceMsgEl.style.color = 'red';
             finalPriceMsgEl.textContent = `下单失败: ${result.error}`;
@@ -237,10 +266,47 @@ async function handlePlaceOrder() {
     }
 }
 
+// 历史订单 (分页)
+async function loadOrderHistory(cursor = null) {
+    try {
+        const params = new URLSearchParams({ limit: 10 });
+        if (cursor) params.set('cursor', cursor);
+        const response = await authFetch(`/api/user/${currentUserId}/orders?${params}`);
+        if (!response.ok) throw new Error('无法获取历史订单');
+
+        const data = await response.json();
+        if (!cursor) orderHistoryListEl.innerHTML = '';
+        historyCursor = data.next_cursor;
+        loadMoreHistoryBtn.style.display = historyCursor ? 'block' : 'none';
+
+        if (!cursor && data.orders.length === 0) {
+            orderHistoryListEl.innerHTML = '<p style="color:#666; font-size:14px;">暂无订单</p>';
+            return;
+        }
+        data.orders.forEach(order => {
+            const el = document.createElement('div');
+            el.className = 'order-card';
+            const items = order.items.map(item => `${item.dish_name} x${item.quantity}`).join(', ');
+            el.innerHTML = `
+                <div style="display:flex; justify-content:space-between; font-weight:bold;">
+                    <span>${order.restaurant_name}</span>
+                    <span>￥${order.total_price.toFixed(2)}</span>
+                </div>
+                <div style="font-size:13px; color:#666;">${order.order_time.replace('T', ' ').slice(0, 16)} · ${order.status}</div>
+                <div style="font-size:13px;">${items}</div>
+            `;
+            orderHistoryListEl.appendChild(el);
+        });
+    } catch (error) {
+        console.error(error);
+        orderHistoryListEl.innerHTML = '<p>加载历史订单失败</p>';
+    }
+}
+
 // --- 7. 记录行为 (不变) ---
 async function logBehavior(actionType, restaurantId) {
     try {
-        await fetch('/api/log/behavior', {
+        await authFetch('/api/log/behavior', {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({
@@ -262,7 +328,7 @@ async function handleRunKmeans() {
     alert('正在后台运行 K-Means 聚类... 这可能需要几秒钟。');
 
     try {
-        const response = await fetch('/api/admin/run_kmeans', {
+        const response = await authFetch('/api/admin/run_kmeans', {
             method: 'POST'
         });
         
@@ -12,10 +12,28 @@ const kmeansBtn = document.getElementById('run-kmeans-btn');
 // 两个订单列表容器
 const pendingOrdersListEl = document.getElementById('pending-orders-list');
 const processingOrdersListEl = document.getElementById('processing-orders-list');
+const confirmAllBtn = document.getElementById('confirm-all-btn');
+const completeAllBtn = document.getElementById('complete-all-btn');
+// 当前显示的订单ID (批量操作用)
+const visibleOrderIds = { Pending: [], Confirmed: [] };
+
+// 需要身份的接口: 带上登录时保存的会话令牌; 令牌过期时回到登录页
+async function authFetch(url, options = {}) {
+    const response = await fetch(url, {
+        ...options,
+        headers: { ...(options.headers || {}), 'Authorization': `Bearer ${localStorage.getItem('session_token')}` }
+    });
+    if (response.status === 401) {
+        alert('登录已过期, 请重新登录');
+        localStorage.clear();
+        window.location.href = '/';
+    }
+    return response;
+}
 
 // --- 1. 页面加载 ---
 document.addEventListener('DOMContentLoaded', () => {
-    if (!currentRestaurantId) {
+    if (!currentRestaurantId || !localStorage.getItem('session_token')) {
         alert('请先登录！');
         window.location.href = '/'; 
         return;
@@ -32,6 +50,8 @@ document.addEventListener('DOMContentLoaded', () => {
     });
     discountForm.addEventListener('submit', handleSaveRules);
     kmeansBtn.addEventListener('click', handleRunKmeans);
+    confirmAllBtn.addEventListener('click', () => updateStatusBatch(visibleOrderIds.Pending, 'Confirmed'));
+    completeAllBtn.addEventListener('click', () => updateStatusBatch(visibleOrderIds.Confirmed, 'Completed'));
 
     // 轮询订单 (同时加载待处理和制作中)
     loadOrders();
@@ -63,7 +83,7 @@ async function handleSaveRules(e) {
         inputFields.forEach(input => {
             rulesPayload.push({ "PriceLevel": parseInt(input.dataset.level), "Discount": parseFloat(input.value) });
         });
-        const response = await fetch(`/api/restaurant/${currentRestaurantId}/rules`, {
+        const response = await authFetch(`/api/restaurant/${currentRestaurantId}/rules`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify(rulesPayload)
@@ -76,7 +96,12 @@ async function handleSaveRules(e) {
 async function handleRunKmeans() {
     // ... (同之前) ...
     alert('正在后台计算...');
-    await fetch('/api/admin/run_kmeans', { method: 'POST' });
+    const response = await authFetch('/api/admin/run_kmeans', { method: 'POST' });
+    if (!response.ok) {
+        const result = await response.json();
+        alert(`K-Means 运行失败: ${result.error}`);
+        return;
+    }
     alert('计算完成，图表稍后将更新');
     initCharts(); // 重新加载图表
 }
@@ -92,9 +117,10 @@ async function loadOrders() {
 
 async function fetchAndRenderOrders(status, containerEl) {
     try {
-        const response = await fetch(`/api/restaurant/${currentRestaurantId}/orders?status=${status}`);
+        const response = await authFetch(`/api/restaurant/${currentRestaurantId}/orders?status=${status}`);
         if (!response.ok) return;
         const orders = await response.json();
+        visibleOrderIds[status] = orders.map(order => order.order_id);
         
         containerEl.innerHTML = '';
         if (orders.length === 0) {
@@ -143,11 +169,30 @@ async function updateStatus(orderId, newStatus) {
     if(!confirm(`确定要更新订单 #${orderId} 为 "${newStatus}" 吗?`)) return;
     
     try {
-        await fetch(`/api/order/${orderId}/update_status`, {
+        const response = await authFetch(`/api/order/${orderId}/update_status`, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
             body: JSON.stringify({ status: newStatus })
         });
+        if (!response.ok) alert((await response.json()).error);
+        loadOrders(); // 立即刷新
+    } catch (e) { alert(e); }
+}
+
+// 批量更新 (一次请求, 服务端一个事务)
+async function updateStatusBatch(orderIds, newStatus) {
+    if (orderIds.length === 0) return;
+    if(!confirm(`确定要把 ${orderIds.length} 个订单更新为 "${newStatus}" 吗?`)) return;
+
+    try {
+        const response = await authFetch(`/api/restaurant/${currentRestaurantId}/orders/status`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ order_ids: orderIds, status: newStatus })
+        });
+        const data = await response.json();
+        if (!response.ok) alert(data.error);
+        else if (data.updated < orderIds.length) alert(data.message);
         loadOrders(); // 立即刷新
     } catch (e) { alert(e); }
 }
@@ -166,7 +211,7 @@ async function initCharts() {
 
     try {
         // 2. 请求后端真实数据
-        const response = await fetch(`/api/restaurant/${currentRestaurantId}/stats`);
+        const response = await authFetch(`/api/restaurant/${currentRestaurantId}/stats`);
         const data = await response.json(); // { dishes_names: [], dishes_values: [], levels_data: [] }
 
         myChartDishes.hideLoading();
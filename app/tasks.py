@@ -3,104 +3,259 @@ import pandas as pd
 from sklearn.cluster import KMeans
 from sklearn.preprocessing import StandardScaler
 import numpy as np
-import os
+import json
+import logging
 import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime
+
+from flask import current_app
+
+try:
+    import resource  # 仅 POSIX: 进程的最大常驻内存 (RSS)
+except ImportError:  # pragma: no cover (Windows)
+    resource = None
 
 # (关键) 将项目根目录添加到 Python 路径中
 
 from . import  db
-from .models import Restaurant, UserBehaviorLog, UserPriceLevel
+from .models import Restaurant, UserBehaviorLog, UserPriceLevel, MLPipelineRun
+from .pricing import publish_price_table
+
+logger = logging.getLogger(__name__)
+
+
+def _max_rss_kb():
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux 的单位是 KB, macOS 是字节
+    return rss / 1024 if sys.platform == 'darwin' else rss
+
+
+class PipelineProfiler:
+    """
+    记录一次管道运行的 "阶段级" 性能数据:
+    每个阶段的耗时、输入/输出行数、内存, 按餐厅分组
+
+    内存默认用 getrusage 的最大 RSS (没有额外开销)。它是进程生命周期内的高水位, 不是本次运行的峰值,
+    所以每个阶段只记录该阶段把高水位抬高了多少 (rss_growth_kb = 结束时 - 开始时),
+    运行级只记录总增长 (rss_growth_kb), 不作为 peak_memory_kb 保存。
+    trace_memory=True (PIPELINE_TRACE_MEMORY) 时改用 tracemalloc 记录每个阶段的分配峰值 (peak_memory_kb);
+    tracemalloc 会拖慢整个 worker 进程的所有内存分配, 峰值也是进程级的 (包含同时在处理的其他请求),
+    只建议在排查问题时临时打开。
+    """
+
+    def __init__(self, trace_memory=False):
+        self.started_at = datetime.now()
+        self._t0 = time.perf_counter()
+        self.stages = []       # 全局阶段 (清空旧数据、写入数据库 ...)
+        self.restaurants = []  # 每个餐厅一条记录, 内含该餐厅的各阶段
+        self.trace_memory = trace_memory
+        self._owns_tracing = trace_memory and not tracemalloc.is_tracing()
+        if self._owns_tracing:
+            tracemalloc.start()
+        self._run_peak = 0
+        self._rss_start = _max_rss_kb()
+
+    def add_restaurant(self, restaurant):
+        entry = {
+            "restaurant_id": restaurant.RestaurantID,
+            "name": restaurant.Name,
+            "status": "ok",
+            "stages": []
+        }
+        self.restaurants.append(entry)
+        return entry
+
+    @contextmanager
+    def stage(self, name, target=None, **info):
+        """
+        用法:
+            with profiler.stage('read_sql', entry) as s:
+                ...
+                s['rows_out'] = len(df)
+        """
+        record = {"stage": name, **info}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+        else:
+            rss_before = _max_rss_kb()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["ms"] = round((time.perf_counter() - start) * 1000, 3)
+            if self.trace_memory:
+                peak = tracemalloc.get_traced_memory()[1]
+                record["peak_memory_kb"] = round(peak / 1024, 1)
+                self._run_peak = max(self._run_peak, peak / 1024)
+            else:
+                rss_after = _max_rss_kb()
+                if rss_after is not None:
+                    record["rss_growth_kb"] = round(rss_after - rss_before, 1)
+            (target["stages"] if target is not None else self.stages).append(record)
+
+    def finish(self, success, levels_written, error=None):
+        if self._owns_tracing:
+            tracemalloc.stop()
+        profile = {
+            "started_at": self.started_at.isoformat(),
+            "duration_ms": round((time.perf_counter() - self._t0) * 1000, 3),
+            "success": success,
+            "levels_written": levels_written,
+            "memory_source": "tracemalloc" if self.trace_memory else "max_rss",
+            "stages": self.stages,
+            "restaurants": self.restaurants,
+        }
+        if self.trace_memory:
+            profile["peak_memory_kb"] = round(self._run_peak, 1)
+        elif self._rss_start is not None:
+            profile["rss_growth_kb"] = round(_max_rss_kb() - self._rss_start, 1)
+        if error:
+            profile["error"] = error
+        return profile
+
+
+def _save_profile(profile):
+    """
+    把性能记录保存到 MLPipelineRun 表 (独立提交, 失败不影响管道本身)
+    """
+    try:
+        run = MLPipelineRun(
+            StartedAt=datetime.fromisoformat(profile["started_at"]),
+            DurationMs=profile["duration_ms"],
+            Success=profile["success"],
+            LevelsWritten=profile["levels_written"],
+            PeakMemoryKB=profile.get("peak_memory_kb"),  # 只有 tracemalloc 模式才有真正的运行峰值
+            Profile=json.dumps(profile, ensure_ascii=False)
+        )
+        db.session.add(run)
+        db.session.commit()
+        return run.RunID
+    except Exception as e:
+        db.session.rollback()
+        logger.error("Error saving pipeline profile: %s", e)
+        return None
 
 
+def _finish(profiler, result, levels_written):
+    profile = profiler.finish(result["success"], levels_written, result.get("error"))
+    result["run_id"] = _save_profile(profile)
+    result["profile"] = profile
+    return result
+
 
 def run_ml_pipeline():
     """
     执行 "Per-Merchant" (逐个商家) 聚类管道
+    返回结果字典, 其中 "profile" 是本次运行的阶段级性能记录 (也会保存到 MLPipelineRun)
     """
-    print("Starting ML Pipeline (Per-Merchant Logic)...")
-    
-    
-        
+    logger.info("Starting ML Pipeline (Per-Merchant Logic)...")
+    profiler = PipelineProfiler(trace_memory=current_app.config.get('PIPELINE_TRACE_MEMORY', False))
+
+
+
         # --- 1. 清空所有旧的 PriceLevel 数据 ---
         #    我们将在循环外一次性清空，并在最后统一提交
     try:
-        UserPriceLevel.query.delete()
-        print("Cleared old UserPriceLevel data.")
+        with profiler.stage('clear_old_levels') as s:
+            s['rows_out'] = UserPriceLevel.query.delete()
+        logger.info("Cleared old UserPriceLevel data.")
     except Exception as e:
             #db.session.rollback()
-        print(f"Error clearing old data: {e}")
-        return
+        logger.error("Error clearing old data: %s", e)
+        return _finish(profiler, {"error": f"Error clearing old data: {str(e)}", "success": False}, 0)
 
         # --- 2. 获取所有餐厅 ---
-    all_restaurants = Restaurant.query.all()
+    with profiler.stage('load_restaurants') as s:
+        all_restaurants = Restaurant.query.all()
+        s['rows_out'] = len(all_restaurants)
     if not all_restaurants:
-        print("No restaurants found. Exiting.")
-        return
+        logger.info("No restaurants found. Exiting.")
+        return _finish(profiler, {"success": True, "message": "没有餐厅, 无需运行 K-Means。"}, 0)
+
+    logger.info("Found %d restaurants to process.", len(all_restaurants))
 
-    print(f"Found {len(all_restaurants)} restaurants to process.")
-        
         # 准备一个列表，收集所有的新 PriceLevel 条目
     all_new_levels = []
 
         # --- 3. (核心逻辑) 遍历每一家餐厅 ---
     for restaurant in all_restaurants:
-        print(f"\n--- Processing Restaurant ID: {restaurant.RestaurantID} ({restaurant.Name}) ---")
-            
+        logger.info("--- Processing Restaurant ID: %s (%s) ---", restaurant.RestaurantID, restaurant.Name)
+        entry = profiler.add_restaurant(restaurant)
+
             # 3.1. (Input) 只查询这家餐厅的行为日志
         query = db.session.query(
-            UserBehaviorLog.UserID, 
+            UserBehaviorLog.UserID,
             UserBehaviorLog.ActionType
         ).filter(UserBehaviorLog.RestaurantID == restaurant.RestaurantID)
-            
-        df_logs = pd.read_sql(query.statement, db.engine)
+
+        with profiler.stage('read_sql', entry) as s:
+            df_logs = pd.read_sql(query.statement, db.engine)
+            s['rows_out'] = len(df_logs)
 
         if df_logs.empty:
-            print("No behavior logs found for this restaurant. Skipping.")
+            logger.info("No behavior logs found for this restaurant. Skipping.")
+            entry['status'] = 'skipped: no behavior logs'
             continue
-                
-        print(f"Loaded {len(df_logs)} behavior logs.")
+
+        logger.info("Loaded %d behavior logs.", len(df_logs))
 
             # 3.2. (Feature Engineering) 为这家餐厅构建特征
             #    注意：index 现在只是 UserID，因为 RestaurantID 是固定的
         try:
-            df_features = pd.pivot_table(
-                df_logs,
-                index=['UserID'], # 索引只是用户
-                columns='ActionType',
-                aggfunc=len,
-                fill_value=0
-            )
+            with profiler.stage('pivot_table', entry, rows_in=len(df_logs)) as s:
+                df_features = pd.pivot_table(
+                    df_logs,
+                    index=['UserID'], # 索引只是用户
+                    columns='ActionType',
+                    aggfunc=len,
+                    fill_value=0
+                )
+                s['rows_out'] = len(df_features)
+                s['feature_shape'] = list(df_features.shape)
         except Exception as e:
-            print(f"Error during pivot_table: {e}. Skipping restaurant.")
+            logger.warning("Error during pivot_table: %s. Skipping restaurant.", e)
+            entry['status'] = f'skipped: pivot_table error: {e}'
             continue
 
-        print("Feature engineering complete. Feature matrix:")
-        print(df_features)
-            
+        # df_features 之后还会被修改, 所以只在 DEBUG 打开时当场转成字符串
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Feature engineering complete. Feature matrix:\n%s", df_features.to_string())
+
             # 3.3. (数据检查) 确定聚类数量
         n_users = len(df_features)
-            
+
             # 我们的目标是 5 个 Level，但如果用户数少于 5，我们就只能聚成 n_users 个簇
-        n_clusters = min(n_users, 5) 
-            
+        n_clusters = min(n_users, 5)
+
         if n_clusters <= 1:
-            print(f"Only {n_users} user(s). Clustering not meaningful. Skipping.")
+            logger.info("Only %d user(s). Clustering not meaningful. Skipping.", n_users)
                 # (可选：可以给这1个用户一个默认等级，但我们暂时跳过)
+            entry['status'] = f'skipped: only {n_users} user(s)'
             continue
-                
-        print(f"Clustering {n_users} users into {n_clusters} levels...")
+
+        logger.info("Clustering %d users into %d levels...", n_users, n_clusters)
 
             # 3.4. (Scaling) 标准化
-        scaler = StandardScaler()
-        features_scaled = scaler.fit_transform(df_features)
+        with profiler.stage('standard_scaler', entry, rows_in=n_users) as s:
+            scaler = StandardScaler()
+            features_scaled = scaler.fit_transform(df_features)
+            s['feature_shape'] = list(features_scaled.shape)
 
             # 3.5. (K-Means) 运行聚类
-        kmeans = KMeans(
-                n_clusters=n_clusters, 
-                random_state=42, 
-                n_init=10
-        )
-        df_features['cluster_raw'] = kmeans.fit_predict(features_scaled)
+        with profiler.stage('kmeans_fit_predict', entry, rows_in=n_users, n_clusters=n_clusters) as s:
+            kmeans = KMeans(
+                    n_clusters=n_clusters,
+                    random_state=42,
+                    n_init=10
+            )
+            df_features['cluster_raw'] = kmeans.fit_predict(features_scaled)
+            s['n_iter'] = int(kmeans.n_iter_)
+            s['inertia'] = float(kmeans.inertia_)
 
             # 3.6. (Rank & Map) 映射聚类到 PriceLevel (1-5)
         centers = kmeans.cluster_centers_
@@ -108,47 +263,79 @@ def run_ml_pipeline():
         cluster_ranking = np.argsort(cluster_value) # 排序
 
         levels = np.round(np.linspace(1, 5, n_clusters)).astype(int)
-            
+
             # { 原始聚类ID: 映射后的 PriceLevel }
         level_map = {cluster_id: levels[rank] for rank, cluster_id in enumerate(cluster_ranking)}
-            
+
         df_features['PriceLevel'] = df_features['cluster_raw'].map(level_map)
 
-        print("Mapped clusters to PriceLevel:")
-        print(f"Raw clusters: {np.unique(df_features['cluster_raw'])}")
-        print(f"Level map: {level_map}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Mapped clusters to PriceLevel: raw clusters %s, level map %s",
+                         np.unique(df_features['cluster_raw']).tolist(),
+                         {int(k): int(v) for k, v in level_map.items()})
 
             # 3.7. (Collect) 收集结果
-        df_output = df_features.reset_index()
-        for _, row in df_output.iterrows():
-            new_level_entry = UserPriceLevel(
-                UserID=int(row['UserID']),
-                RestaurantID=restaurant.RestaurantID, # 关键：使用当前循环的餐厅ID
-                PriceLevel=int(row['PriceLevel'])
-            )
-            all_new_levels.append(new_level_entry)
-            
-        print(f"Processed {len(df_output)} users for this restaurant.")
-        
-        # --- 4. (Output) 统一写入数据库 ---
-        total_updated = 0
-        if all_new_levels:
-            try:
+        with profiler.stage('collect_levels', entry, rows_in=n_users) as s:
+            df_output = df_features.reset_index()
+            for _, row in df_output.iterrows():
+                new_level_entry = UserPriceLevel(
+                    UserID=int(row['UserID']),
+                    RestaurantID=restaurant.RestaurantID, # 关键：使用当前循环的餐厅ID
+                    PriceLevel=int(row['PriceLevel'])
+                )
+                all_new_levels.append(new_level_entry)
+            s['rows_out'] = len(df_output)
+
+        logger.info("Processed %d users for this restaurant.", len(df_output))
+
+    # --- 4. (Output) 所有餐厅处理完后, 统一写入数据库 ---
+    total_updated = 0
+    if all_new_levels:
+        try:
+            with profiler.stage('write_levels', rows_in=len(all_new_levels)) as s:
                 db.session.add_all(all_new_levels)
                 db.session.commit()
-                total_updated = len(all_new_levels)
-                print(f"\n--- ML Pipeline Complete! ---")
-                print(f"Successfully updated/inserted {total_updated} entries.")
-            except Exception as e:
-                db.session.rollback()
-                print(f"\nError committing new levels to DB: {e}")
-                return {"error": f"DB commit error: {str(e)}", "success": False}
-        else:
-            print("\n--- ML Pipeline Complete! ---")
-            print("No new price levels were generated.")
-            
-        # (新) 返回一个成功的结果字典
-        return {"success": True, "message": f"K-Means 运行完毕！成功更新 {total_updated} 条用户等级。"}
+                s['rows_out'] = len(all_new_levels)
+            total_updated = len(all_new_levels)
+            # 新的等级对所有 worker 进程原子地生效
+            with profiler.stage('publish_price_table'):
+                publish_price_table()
+            logger.info("--- ML Pipeline Complete! --- Successfully updated/inserted %d entries.", total_updated)
+        except Exception as e:
+            db.session.rollback()
+            logger.error("Error committing new levels to DB: %s", e)
+            return _finish(profiler, {"error": f"DB commit error: {str(e)}", "success": False}, 0)
+    else:
+        # 旧等级已被清空, 也要提交并刷新价格表
+        db.session.commit()
+        publish_price_table()
+        logger.info("--- ML Pipeline Complete! --- No new price levels were generated.")
+
+    # (新) 返回一个成功的结果字典
+    return _finish(profiler, {"success": True, "message": f"K-Means 运行完毕！成功更新 {total_updated} 条用户等级。"}, total_updated)
+
+
+def get_pipeline_runs(limit=20):
+    """
+    最近几次管道运行的摘要 (不含完整 profile)
+    """
+    runs = MLPipelineRun.query.order_by(MLPipelineRun.RunID.desc()).limit(limit).all()
+    return [{
+        "run_id": r.RunID,
+        "started_at": r.StartedAt.isoformat(),
+        "duration_ms": r.DurationMs,
+        "success": r.Success,
+        "levels_written": r.LevelsWritten,
+        "peak_memory_kb": r.PeakMemoryKB
+    } for r in runs]
+
+
+def get_pipeline_run(run_id):
+    """
+    某一次运行的完整 profile; 不存在时返回 None
+    """
+    run = db.session.get(MLPipelineRun, run_id)
+    return json.loads(run.Profile) if run else None
 
 if __name__ == '__main__':
-    run_ml_pipeline()
\ No newline at end of file
+    run_ml_pipeline()
@@ -1,5 +1,7 @@
 # /config.py
 import os
+import secrets
+import sys
 
 basedir = os.path.abspath(os.path.dirname(__file__))
 instance_path = os.path.join(basedir, 'instance')
@@ -7,4 +9,91 @@ os.makedirs(instance_path, exist_ok=True)
 
 class Config:
     SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(instance_path, 'canteen.db')}"
-    SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # 多进程同时写 SQLite 时, 等锁最多 15 秒, 而不是立刻报 "database is locked"
+    SQLALCHEMY_ENGINE_OPTIONS = {"connect_args": {"timeout": 15}}
+
+    # --- 跨进程共享的价格表 (app/pricing.py) ---
+    # 依赖 mmap + os.replace 原子替换, 只在 POSIX 系统上默认开启;
+    # 关闭时每个请求直接查询 UserPriceLevel / MerchantDiscountRule
+    PRICE_TABLE_ENABLED = os.name == 'posix'
+    PRICE_TABLE_PATH = os.path.join(instance_path, 'price_table.bin')
+
+    # --- 餐厅目录快照 (app/catalog.py), 同样依赖 mmap 共享 ---
+    # 关闭时每个进程自己查询并缓存 (只有本进程的修改会让缓存失效)
+    CATALOG_SNAPSHOT_ENABLED = os.name == 'posix'
+    CATALOG_SNAPSHOT_PATH = os.path.join(instance_path, 'catalog.bin')
+    CATALOG_PAGE_SIZE = 20      # GET /api/restaurants 默认每页条数
+    CATALOG_MAX_PAGE_SIZE = 100
+
+    # --- 订单组提交 (app/order_intake.py) ---
+    # 开启后, 同一 worker 内并发到达的订单合并成一个事务提交 (一次 fsync)
+    ORDER_GROUP_COMMIT = os.environ.get('CANTEEN_ORDER_GROUP_COMMIT', '0') == '1'
+    ORDER_BATCH_MAX_SIZE = 32     # 每批最多多少单
+    ORDER_BATCH_WINDOW_MS = 5     # 第一单到达后最多再等多少毫秒凑批
+    ORDER_BATCH_WAIT_TIMEOUT = 10 # 请求线程最多等待多少秒
+
+    # --- 登录 (app/auth.py) ---
+    # 会话令牌的签名密钥: 生产环境必须通过环境变量固定, 否则每次重启后所有令牌失效
+    # (serve.py 在 fork 之前加载配置, 所有 worker 共用同一个随机密钥)
+    SECRET_KEY = os.environ.get('CANTEEN_SECRET_KEY') or secrets.token_hex(32)
+    SESSION_TOKEN_MAX_AGE = 7 * 24 * 3600  # 令牌有效期 (秒)
+    # 管理员用户名 (逗号分隔), 只有他们能访问 /api/admin/* (导入账号、运行 K-Means、查看指标 ...)
+    ADMIN_USERNAMES = frozenset(
+        name.strip() for name in os.environ.get('CANTEEN_ADMIN_USERNAMES', '').split(',') if name.strip()
+    )
+    # 每个 worker 进程同时最多计算几个密码哈希, 最多几个在排队, 最多等几秒
+    PASSWORD_HASH_WORKERS = int(os.environ.get('CANTEEN_PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = 32
+    PASSWORD_HASH_TIMEOUT = 5
+
+    # --- 批量导入账号 (app/bulk_import.py, scripts/import_accounts.py) ---
+    BULK_IMPORT_PROCESSES = None    # 哈希进程数; None 表示 CPU 核心数
+    BULK_IMPORT_BATCH_SIZE = 1000   # 每个事务写入多少个账号
+    BULK_IMPORT_MAX_ROWS = 100000   # 单次 API 请求最多导入多少行
+    # API 导入在独立进程中执行: 启动命令 (后面会加上 kind、输入和 --report 参数) 和任务状态目录
+    BULK_IMPORT_COMMAND = [sys.executable, os.path.join(basedir, 'scripts', 'import_accounts.py')]
+    BULK_IMPORT_JOB_DIR = os.path.join(instance_path, 'imports')
+
+    # --- JSON 序列化 (app/json_provider.py) ---
+    # 'fast': 安装了 orjson 时用 orjson; 'default': Flask 自带实现
+    JSON_PROVIDER = os.environ.get('CANTEEN_JSON_PROVIDER', 'fast')
+
+    # --- 日志 (app/logging_setup.py) ---
+    LOG_LEVEL = os.environ.get('CANTEEN_LOG_LEVEL', 'INFO')
+    # 按 Flask endpoint 对 INFO/DEBUG 日志采样 (1.0 = 全部记录); WARNING 及以上不采样
+    LOG_SAMPLING = {
+        'api.get_dishes_for_restaurant': 0.01,
+        'api.create_order': 1.0,
+    }
+
+    # --- 请求统计 (app/metrics.py) ---
+    # 慢请求日志阈值 (毫秒); None 表示关闭。超过阈值的请求会打印出它执行的全部 SQL
+    SLOW_REQUEST_LOG_MS = int(os.environ['CANTEEN_SLOW_REQUEST_MS']) if os.environ.get('CANTEEN_SLOW_REQUEST_MS') else None
+    # 多个 worker 的计数汇总到这个目录 (每个 worker 一个文件); None 表示只统计本进程
+    METRICS_DIR = os.path.join(instance_path, 'metrics')
+    METRICS_FLUSH_INTERVAL = 1.0  # worker 每隔几秒写一次自己的累计值
+
+    # --- K-Means 管道 profile (app/tasks.py) ---
+    # 默认只记录每个阶段进程最大 RSS 的增长; 打开后用 tracemalloc 记录每个阶段的分配峰值 (会拖慢同一 worker 的所有请求)
+    PIPELINE_TRACE_MEMORY = os.environ.get('CANTEEN_PIPELINE_TRACE_MEMORY', '0') == '1'
+
+    # --- 生产部署 (serve.py, 多进程 pre-fork) ---
+    # 生产环境必须关闭调试器
+    DEBUG = False
+    SERVER_BIND = os.environ.get('CANTEEN_BIND', '0.0.0.0:8000')
+    # 默认每个 CPU 核心一个 worker 进程 (+1 个备用)
+    SERVER_WORKERS = int(os.environ.get('CANTEEN_WORKERS', (os.cpu_count() or 1) + 1))
+    # 每个 worker 进程内的线程数
+    SERVER_THREADS = int(os.environ.get('CANTEEN_THREADS', 4))
+    # worker 超过这么多秒无响应就会被 master 杀掉并重启
+    SERVER_TIMEOUT = int(os.environ.get('CANTEEN_TIMEOUT', 30))
+    # 优雅重启时等待正在处理的请求的秒数
+    SERVER_GRACEFUL_TIMEOUT = int(os.environ.get('CANTEEN_GRACEFUL_TIMEOUT', 30))
+    SERVER_KEEPALIVE = int(os.environ.get('CANTEEN_KEEPALIVE', 5))
+
+    # --- 午高峰准入控制 (app/admission.py), 每个 worker 进程单独计数 ---
+    # None: 启动时按 SERVER_THREADS 和 ORDER_GROUP_COMMIT 分配 (见 app/admission.py 的 default_limits);
+    # 也可以直接写 {'order_create': {...}, 'menu': {...}} 覆盖
+    ADMISSION_CONTROL_ENABLED = True
+    ADMISSION_LIMITS = None
@@ -25,4 +25,7 @@ def merchant_dashboard():
     """
     return render_template('merchant_dashboard.html')
 if __name__ == '__main__':
+    # 仅用于本地开发 (单进程 + 调试器); 生产环境请使用 serve.py
+    from app.metrics import reset_metrics_dir
+    reset_metrics_dir(app.config['METRICS_DIR'])
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,190 @@
+# /scripts/bench_read_paths.py
+"""
+列表接口读路径基准测试: ORM 实例 vs Core select() 列投影
+
+在一个临时 SQLite 数据库中生成模拟数据, 对每个接口分别用
+    - ORM:  Model.query ... + 逐个属性拷贝进 dict (旧实现)
+    - Core: app/row_mapping.py 中的 RowMapper (新实现)
+构造同样的 JSON 数据, 记录平均延迟和 tracemalloc 统计的内存分配峰值。
+
+用法:
+    python scripts/bench_read_paths.py [--restaurants 200] [--dishes 50] [--orders 20000] [--repeat 30]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from config import Config
+from app import create_app, db
+from app.models import Restaurant, MerchantDiscountRule, Dish, Order, OrderItem, User
+from app.row_mapping import RESTAURANT_ROWS, RULE_ROWS, DISH_ROWS, ORDER_FEED_ROWS, attach_order_items
+
+
+def build_config(workdir):
+    class BenchConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+        # 快照、指标和导入任务目录都指向临时目录, 避免覆盖 instance/ 下正在使用的文件
+        PRICE_TABLE_PATH = os.path.join(workdir, 'price_table.bin')
+        CATALOG_SNAPSHOT_PATH = os.path.join(workdir, 'catalog.bin')
+        METRICS_DIR = os.path.join(workdir, 'metrics')
+        BULK_IMPORT_JOB_DIR = os.path.join(workdir, 'imports')
+        LOG_LEVEL = 'WARNING'
+    return BenchConfig
+
+
+def generate_data(n_restaurants, n_dishes, n_orders):
+    """
+    用 Core 批量插入生成模拟数据 (不计入基准)
+    """
+    rng = random.Random(42)
+    conn = db.session.connection()
+    conn.execute(User.__table__.insert(), [
+        {"UserID": i, "Username": f"user{i}", "PasswordHash": "x", "Area": f"区{i % 5}"}
+        for i in range(1, 1001)
+    ])
+    conn.execute(Restaurant.__table__.insert(), [
+        {"RestaurantID": r, "MerchantUsername": f"m{r}", "MerchantPasswordHash": "x",
+         "Name": f"餐厅{r}", "Location": f"位置{r % 10}"}
+        for r in range(1, n_restaurants + 1)
+    ])
+    conn.execute(Dish.__table__.insert(), [
+        {"DishID": (r - 1) * n_dishes + d, "RestaurantID": r, "Name": f"菜品{r}-{d}",
+         "BasePrice": round(rng.uniform(1, 30), 1), "image_url": f"https://example.com/{r}/{d}.png"}
+        for r in range(1, n_restaurants + 1) for d in range(1, n_dishes + 1)
+    ])
+    conn.execute(MerchantDiscountRule.__table__.insert(), [
+        {"RestaurantID": r, "PriceLevel": lvl, "Discount": 0.8 + 0.05 * lvl}
+        for r in range(1, n_restaurants + 1) for lvl in range(1, 6)
+    ])
+    start = datetime(2025, 1, 1)
+    orders, items = [], []
+    for o in range(1, n_orders + 1):
+        r = 1 + o % n_restaurants
+        orders.append({"OrderID": o, "UserID": rng.randint(1, 1000), "RestaurantID": r,
+                       "Status": rng.choice(["Pending", "Confirmed", "Completed"]),
+                       "TotalPrice": 10.0, "OrderTime": start + timedelta(minutes=o)})
+        for _ in range(3):
+            items.append({"OrderID": o, "DishID": (r - 1) * n_dishes + rng.randint(1, n_dishes),
+                          "Quantity": rng.randint(1, 3), "FinalPricePerItem": 5.0})
+    conn.execute(Order.__table__.insert(), orders)
+    conn.execute(OrderItem.__table__.insert(), items)
+    db.session.commit()
+
+
+# --- 旧实现 (ORM) ---
+
+def orm_restaurants(_):
+    return [{"id": r.RestaurantID, "name": r.Name, "location": r.Location} for r in Restaurant.query.all()]
+
+
+def orm_rules(rid):
+    rules = MerchantDiscountRule.query.filter_by(RestaurantID=rid).all()
+    return sorted([{"PriceLevel": r.PriceLevel, "Discount": r.Discount} for r in rules], key=lambda x: x['PriceLevel'])
+
+
+def orm_dishes(rid):
+    return [{"id": d.DishID, "name": d.Name, "base_price": d.BasePrice, "image_url": d.image_url}
+            for d in Dish.query.filter_by(RestaurantID=rid).all()]
+
+
+def orm_order_feed(rid):
+    output = []
+    for order in Order.query.filter_by(RestaurantID=rid).order_by(Order.OrderTime.desc()).limit(50).all():
+        output.append({
+            "order_id": order.OrderID,
+            "user_name": order.User.Username if order.User else "未知用户",
+            "status": order.Status,
+            "total_price": order.TotalPrice,
+            "order_time": order.OrderTime.isoformat(),
+            "items": [{"dish_name": i.Dish.Name if i.Dish else "未知菜品", "quantity": i.Quantity,
+                       "final_price_per_item": i.FinalPricePerItem} for i in order.Items]
+        })
+    return output
+
+
+# --- 新实现 (Core + RowMapper) ---
+
+def core_restaurants(_):
+    return RESTAURANT_ROWS.to_dicts(db.session.execute(RESTAURANT_ROWS.select()).all())
+
+
+def core_rules(rid):
+    stmt = RULE_ROWS.select().where(MerchantDiscountRule.RestaurantID == rid).order_by(MerchantDiscountRule.PriceLevel)
+    return RULE_ROWS.to_dicts(db.session.execute(stmt).all())
+
+
+def core_dishes(rid):
+    return DISH_ROWS.to_dicts(db.session.execute(DISH_ROWS.select().where(Dish.RestaurantID == rid)).all())
+
+
+def core_order_feed(rid):
+    stmt = (ORDER_FEED_ROWS.select().select_from(Order)
+            .outerjoin(User, User.UserID == Order.UserID)
+            .where(Order.RestaurantID == rid)
+            .order_by(Order.OrderTime.desc()).limit(50))
+    return attach_order_items(db.session, ORDER_FEED_ROWS.to_dicts(db.session.execute(stmt).all()))
+
+
+def measure(func, rid, repeat):
+    """
+    返回 (平均毫秒, 单次调用的内存分配峰值 KB)
+    每次调用结束后清空 session, 避免 identity map 在多次调用之间复用对象
+    """
+    func(rid)  # 预热 (编译 SQL 缓存)
+    db.session.remove()
+
+    elapsed = 0.0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(rid)
+        elapsed += time.perf_counter() - start
+        db.session.remove()
+
+    tracemalloc.start()
+    func(rid)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    db.session.remove()
+    return elapsed / repeat * 1000, peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--restaurants', type=int, default=200)
+    parser.add_argument('--dishes', type=int, default=50)
+    parser.add_argument('--orders', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        app = create_app(build_config(workdir))
+        with app.app_context():
+            generate_data(args.restaurants, args.dishes, args.orders)
+
+            cases = [
+                ("GET /api/restaurants", orm_restaurants, core_restaurants),
+                ("GET /api/restaurant/<id>/rules", orm_rules, core_rules),
+                ("dish rows (menu price table)", orm_dishes, core_dishes),
+                ("GET /api/restaurant/<id>/orders", orm_order_feed, core_order_feed),
+            ]
+            print(f"{args.restaurants} restaurants, {args.dishes} dishes each, {args.orders} orders; "
+                  f"mean of {args.repeat} runs\n")
+            print(f"{'endpoint':34} {'ORM ms':>8} {'Core ms':>8} {'speedup':>8} {'ORM KB':>9} {'Core KB':>9} {'alloc':>7}")
+            for name, orm_func, core_func in cases:
+                assert orm_func(1) == core_func(1), f"{name}: ORM 与 Core 结果不一致"
+                db.session.remove()
+                orm_ms, orm_kb = measure(orm_func, 1, args.repeat)
+                core_ms, core_kb = measure(core_func, 1, args.repeat)
+                print(f"{name:34} {orm_ms:8.2f} {core_ms:8.2f} {orm_ms / core_ms:7.1f}x "
+                      f"{orm_kb:9.1f} {core_kb:9.1f} {core_kb / orm_kb:6.0%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# /scripts/import_accounts.py
+"""
+从 CSV / JSON 文件批量导入账号 (新生用户 / 商家), 逻辑见 app/bulk_import.py
+
+CSV 第一行是表头:
+    users:       username,password,area
+    restaurants: username,password,name,location,image_url
+
+用法:
+    python scripts/import_accounts.py users students_2025.csv
+    python scripts/import_accounts.py restaurants merchants.json [--processes 8] [--batch-size 2000]
+    python scripts/import_accounts.py users - --format json --report job.json   (从 stdin 读取, 把状态写入 job.json)
+
+POST /api/admin/import/<kind> 也是用这个脚本在后台执行导入 (见 app/bulk_import.py 的 start_import_job)
+"""
+import argparse
+import os
+import sys
+import traceback
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from app import create_app
+from config import Config
+from app.bulk_import import ACCOUNT_KINDS, import_accounts, parse_accounts, write_job_report
+
+
+def main(config_class=Config):
+    parser = argparse.ArgumentParser(description="批量导入账号")
+    parser.add_argument('kind', choices=sorted(ACCOUNT_KINDS))
+    parser.add_argument('path', help="CSV 或 JSON 文件, '-' 表示从 stdin 读取")
+    parser.add_argument('--format', choices=['csv', 'json'], help="默认按文件扩展名判断")
+    parser.add_argument('--processes', type=int, help="哈希进程数 (默认: CPU 核心数)")
+    parser.add_argument('--batch-size', type=int, help="每个事务写入多少个账号")
+    parser.add_argument('--report', help="把任务状态和结果报告 (JSON) 写入这个文件")
+    args = parser.parse_args()
+
+    fmt = args.format or ('json' if args.path.lower().endswith('.json') else 'csv')
+    if args.path == '-':
+        data = sys.stdin.buffer.read().decode('utf-8-sig')
+    else:
+        with open(args.path, encoding='utf-8-sig', newline='') as f:
+            data = f.read()
+
+    try:
+        rows = parse_accounts(data, fmt)
+        if args.report:
+            write_job_report(args.report, {"kind": args.kind, "status": "running", "total": len(rows), "pid": os.getpid()})
+        app = create_app(config_class)
+        with app.app_context():
+            report = import_accounts(args.kind, rows, processes=args.processes, batch_size=args.batch_size)
+    except Exception as e:
+        if args.report:
+            write_job_report(args.report, {"kind": args.kind, "status": "failed", "error": str(e)})
+        traceback.print_exc()
+        return 1
+    if args.report:
+        write_job_report(args.report, {"status": "done", **report})
+
+    print(f"Imported {report['created']} / {report['total']} {args.kind} in {report['duration_ms'] / 1000:.1f}s.")
+    for item in report['skipped'][:20]:
+        print(f"  skipped row {item['row']} ({item['username']}): {item['error']}")
+    if len(report['skipped']) > 20:
+        print(f"  ... {len(report['skipped']) - 20} more skipped rows")
+    for batch in report['failed_batches']:
+        print(f"  failed rows {batch['first_row']}-{batch['last_row']}: {batch['error']}")
+    return 0 if not report['failed_batches'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,6 +6,8 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from app.models import User, Restaurant, Dish, UserBehaviorLog, MerchantDiscountRule, UserPriceLevel, Order, OrderItem
 from datetime import datetime
 from app import create_app , db
+from app.pricing import publish_price_table
+from app.search import fts_enabled, rebuild_search_index
 app = create_app()
 def seed_data():
     """
@@ -124,6 +126,11 @@ def seed_data():
 
         # --- 7. 提交所有更改 ---
         db.session.commit()
+        publish_price_table() # 数据库已重建, 刷新共享价格表
+        # drop_all 不会删除 FTS5 搜索索引 (不在 models 中), 这里整体重建
+        if fts_enabled():
+            with db.engine.begin() as conn:
+                rebuild_search_index(conn)
         print("\n--- Seeding Complete! ---")
         print(f"Database populated with demo data: {os.path.join(app.instance_path, 'canteen.db')}")
 
@@ -0,0 +1,71 @@
+# /serve.py
+"""
+生产环境入口 (多进程 + 多线程)
+
+用法:
+    python serve.py
+
+与 run.py 的区别:
+    - run.py 使用 Flask 自带的单进程开发服务器, 并且开着调试器
+    - serve.py 使用 gunicorn 预先 fork 出 SERVER_WORKERS 个 worker 进程,
+      每个进程内再开 SERVER_THREADS 个线程, 吞吐量随 CPU 核心数增长
+
+所有参数都在 config.Config 中 (可以用 CANTEEN_* 环境变量覆盖)。
+"""
+from gunicorn.app.base import BaseApplication
+
+from app import dispose_engines_after_fork
+from app.metrics import reset_metrics_dir
+from config import Config
+from run import app
+
+
+def post_fork(server, worker):
+    """
+    gunicorn 钩子: 每个 worker 进程 fork 完成后执行
+    丢弃从 master 继承来的数据库连接
+    """
+    dispose_engines_after_fork(app)
+    server.log.info(f"Worker {worker.pid}: SQLAlchemy engine disposed after fork.")
+
+
+class CanteenServer(BaseApplication):
+    """
+    把 gunicorn 嵌入到 Python 代码中, 不需要单独的 gunicorn 配置文件
+    """
+
+    def __init__(self, application, options=None):
+        self.application = application
+        self.options = options or {}
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key.lower(), value)
+
+    def load(self):
+        return self.application
+
+
+def build_options(config_class=Config):
+    return {
+        'bind': config_class.SERVER_BIND,
+        'workers': config_class.SERVER_WORKERS,
+        'threads': config_class.SERVER_THREADS,
+        'worker_class': 'gthread',
+        'timeout': config_class.SERVER_TIMEOUT,
+        'graceful_timeout': config_class.SERVER_GRACEFUL_TIMEOUT,
+        'keepalive': config_class.SERVER_KEEPALIVE,
+        # (关键) master 进程只加载一次应用, worker 通过 fork 共享代码和只读内存
+        'preload_app': True,
+        'post_fork': post_fork,
+    }
+
+
+if __name__ == '__main__':
+    # 上一次运行留下的请求统计 (各 worker 的文件) 不计入本次
+    reset_metrics_dir(Config.METRICS_DIR)
+    options = build_options()
+    print(f"Starting CanteenDB: {options['workers']} workers x {options['threads']} threads on {options['bind']}")
+    CanteenServer(app, options).run()